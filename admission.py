@@ -0,0 +1,210 @@
+"""
+Admission.py - Controle de admissão para as rotas de upload do Monitor.AI
+Limita análises simultâneas, mantém uma fila de espera curta e recusa o excesso
+com 429 + Retry-After estimado pela latência recente de cada etapa
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Optional
+
+from flask import current_app, jsonify
+
+# Latência assumida por análise enquanto não há medições
+DEFAULT_REQUEST_SECONDS = 30.0
+
+# Peso da medição mais recente na média móvel das etapas
+LATENCY_ALPHA = 0.2
+
+
+class AdmissionController:
+    """Semáforo com fila limitada e métricas de ocupação"""
+
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted_total = 0
+        self.rejected_total = 0
+        self.timeout_total = 0
+        self.stage_latency: Dict[str, float] = {}
+
+    # --- admissão ---
+    def acquire(self) -> bool:
+        """Ocupa uma vaga, esperando na fila se houver espaço; False = recusar"""
+        with self._cond:
+            if self.in_flight < self.max_in_flight and not self.waiting:
+                self.in_flight += 1
+                self.admitted_total += 1
+                return True
+            if self.waiting >= self.max_queue:
+                self.rejected_total += 1
+                return False
+
+            self.waiting += 1
+            try:
+                admitted = self._cond.wait_for(
+                    lambda: self.in_flight < self.max_in_flight, timeout=self.queue_timeout
+                )
+            finally:
+                self.waiting -= 1
+            if not admitted:
+                self.rejected_total += 1
+                self.timeout_total += 1
+                return False
+            self.in_flight += 1
+            self.admitted_total += 1
+            return True
+
+    def try_acquire(self) -> bool:
+        """Ocupa uma vaga só se houver uma livre agora, sem passar à frente da fila"""
+        with self._cond:
+            if self.in_flight < self.max_in_flight and not self.waiting:
+                self.in_flight += 1
+                self.admitted_total += 1
+                return True
+            return False
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    # --- latências ---
+    def record_stage(self, stage: str, seconds: float):
+        """Atualiza a média móvel exponencial da etapa"""
+        with self._cond:
+            previous = self.stage_latency.get(stage)
+            if previous is None:
+                self.stage_latency[stage] = seconds
+            else:
+                self.stage_latency[stage] = previous + LATENCY_ALPHA * (seconds - previous)
+
+    @contextmanager
+    def measure(self, stage: str):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, time.perf_counter() - inicio)
+
+    def retry_after(self) -> int:
+        """Segundos até uma vaga provavelmente abrir para um novo pedido"""
+        with self._cond:
+            per_request = sum(self.stage_latency.values()) or DEFAULT_REQUEST_SECONDS
+            ahead = self.waiting + 1
+        return max(1, math.ceil(per_request * ahead / self.max_in_flight))
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'in_flight': self.in_flight,
+                'queue_depth': self.waiting,
+                'max_in_flight': self.max_in_flight,
+                'max_queue': self.max_queue,
+                'admitted_total': self.admitted_total,
+                'rejected_total': self.rejected_total,
+                'queue_timeout_total': self.timeout_total,
+                'stage_latency_seconds': {
+                    stage: round(value, 3) for stage, value in self.stage_latency.items()
+                },
+            }
+
+    # --- integração com Flask ---
+    def init_app(self, app):
+        app.extensions['admission'] = self
+
+    def call(self, view, *args, **kwargs):
+        """
+        Executa a rota sob admissão, antes de ler o corpo do pedido
+        Em respostas em streaming a vaga só é liberada quando o stream termina
+        """
+        if not self.acquire():
+            retry = self.retry_after()
+            response = jsonify({
+                'success': False,
+                'relatorio': 'Servidor ocupado, tente novamente em instantes',
+                'retry_after': retry
+            })
+            response.status_code = 429
+            response.headers['Retry-After'] = str(retry)
+            return response
+
+        try:
+            response = view(*args, **kwargs)
+        except Exception:
+            self.release()
+            raise
+
+        body = response[0] if isinstance(response, tuple) else response
+        if getattr(body, 'is_streamed', False):
+            body.call_on_close(self.release)
+        else:
+            self.release()
+        return response
+
+    def limit(self, view):
+        """Decorador de rota com este controlador"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            return self.call(view, *args, **kwargs)
+        return wrapper
+
+
+class BatchSlots:
+    """
+    Vagas de um lote já admitido, cobradas por arquivo
+
+    O lote começa com as `reserved` vagas que o pedido ocupou na admissão e
+    processa um arquivo por vaga própria; arquivos a mais só rodam em paralelo
+    se pegarem uma vaga livre do controlador. Assim in_flight conta arquivos em
+    análise, e um lote nunca trava esperando vagas ocupadas por outros lotes.
+    """
+
+    # Intervalo para reconferir vagas livres do controlador e o sinal de parada
+    POLL_SECONDS = 0.5
+
+    def __init__(self, controller: AdmissionController, reserved: int = 1):
+        self.controller = controller
+        self._cond = threading.Condition()
+        self._free = reserved
+
+    def _release_own(self):
+        with self._cond:
+            self._free += 1
+            self._cond.notify()
+
+    def acquire(self, stop: Optional[threading.Event] = None) -> Optional[Callable[[], None]]:
+        """
+        Espera uma vaga para um arquivo; devolve a função que a libera,
+        ou None se `stop` foi sinalizado antes
+        """
+        with self._cond:
+            while True:
+                if stop is not None and stop.is_set():
+                    return None
+                if self._free > 0:
+                    self._free -= 1
+                    return self._release_own
+                if self.controller.try_acquire():
+                    return self.controller.release
+                self._cond.wait(timeout=self.POLL_SECONDS)
+
+
+def current_admission() -> AdmissionController:
+    """Controlador registrado no app atual (ver init_app)"""
+    return current_app.extensions['admission']
+
+
+def limit(view):
+    """Decorador de rota para blueprints: usa o controlador do app que atende o pedido"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        return current_admission().call(view, *args, **kwargs)
+    return wrapper
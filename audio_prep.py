@@ -0,0 +1,190 @@
+"""
+Audio_prep.py - Pré-processamento de áudio para o Monitor.AI
+Converte WAV para mono 16 bits em taxa de telefonia e remove silêncio nas pontas,
+lendo o arquivo em blocos para não carregar a gravação inteira na memória
+"""
+
+import os
+import wave
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Taxa de saída: voz de telefonia não precisa de mais que 8-16 kHz
+TARGET_RATE = int(os.environ.get('AUDIO_TARGET_RATE', 16000))
+
+# Blocos abaixo deste nível (dBFS, RMS) contam como silêncio
+SILENCE_DBFS = float(os.environ.get('AUDIO_SILENCE_DBFS', -40))
+
+# Tamanho da janela usada para detectar silêncio
+SILENCE_BLOCK_MS = 20
+
+# Quantidade de frames lidos do WAV por vez
+CHUNK_FRAMES = 65536
+
+
+def _frames_to_mono(raw: bytes, sampwidth: int, channels: int) -> np.ndarray:
+    """Converte frames PCM em amostras mono float32 na escala de 16 bits"""
+    if sampwidth == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) * 256.0
+    elif sampwidth == 2:
+        samples = np.frombuffer(raw, dtype='<i2').astype(np.float32)
+    elif sampwidth == 3:
+        # Usa só os dois bytes mais significativos de cada amostra de 24 bits
+        triplets = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        samples = (triplets[:, 1:].copy().view('<i2').reshape(-1)).astype(np.float32)
+    elif sampwidth == 4:
+        samples = (np.frombuffer(raw, dtype='<i4') >> 16).astype(np.float32)
+    else:
+        raise ValueError(f'Largura de amostra não suportada: {sampwidth}')
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples
+
+
+class _StreamResampler:
+    """Reamostragem linear em fluxo, com filtro média móvel antes de decimar"""
+
+    def __init__(self, src_rate: int, dst_rate: int):
+        self.step = src_rate / dst_rate
+        self.enabled = src_rate != dst_rate
+        taps = int(round(self.step)) if self.step >= 2 else 1
+        self.kernel = np.full(taps, 1.0 / taps, dtype=np.float32) if taps > 1 else None
+        self.filter_tail = np.zeros(taps - 1, dtype=np.float32)
+        self.prev = None
+        self.pos = 0.0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        if not self.enabled or not len(samples):
+            return samples
+
+        if self.kernel is not None:
+            padded = np.concatenate((self.filter_tail, samples))
+            self.filter_tail = padded[len(padded) - len(self.filter_tail):]
+            samples = np.convolve(padded, self.kernel, mode='valid').astype(np.float32)
+
+        buf = samples if self.prev is None else np.concatenate((self.prev, samples))
+        last = len(buf) - 1
+        if self.pos > last:
+            self.pos -= len(samples)
+            self.prev = buf[-1:]
+            return np.empty(0, dtype=np.float32)
+
+        positions = np.arange(self.pos, last + 1e-9, self.step)
+        out = np.interp(positions, np.arange(len(buf)), buf).astype(np.float32)
+
+        # Próxima posição relativa ao início do buffer seguinte (que começa em buf[-1])
+        self.pos = positions[-1] + self.step - last
+        self.prev = buf[-1:]
+        return out
+
+
+class _SilenceTrimmer:
+    """
+    Remove silêncio do início e do fim mantendo o do meio
+    O silêncio após a última fala fica pendente até aparecer fala de novo
+    """
+
+    def __init__(self, rate: int, threshold_dbfs: float):
+        self.block = max(1, int(rate * SILENCE_BLOCK_MS / 1000))
+        self.threshold = 32768.0 * (10 ** (threshold_dbfs / 20))
+        self.remainder = np.empty(0, dtype=np.float32)
+        self.pending = []
+        self.started = False
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        samples = np.concatenate((self.remainder, samples))
+        usable = len(samples) - len(samples) % self.block
+        self.remainder = samples[usable:]
+        if not usable:
+            return np.empty(0, dtype=np.float32)
+
+        blocks = samples[:usable].reshape(-1, self.block)
+        loud = np.flatnonzero(np.sqrt(np.mean(blocks * blocks, axis=1)) >= self.threshold)
+
+        if not len(loud):
+            if self.started:
+                self.pending.append(samples[:usable])
+            return np.empty(0, dtype=np.float32)
+
+        first = 0 if self.started else loud[0]
+        end = (loud[-1] + 1) * self.block
+        out = self.pending + [samples[first * self.block:end]]
+        self.pending = [samples[end:usable]]
+        self.started = True
+        return np.concatenate(out)
+
+
+def _to_pcm16(samples: np.ndarray) -> bytes:
+    return np.clip(np.rint(samples), -32768, 32767).astype('<i2').tobytes()
+
+
+def normalize_wav(src_path: str, dst_path: str,
+                  target_rate: int = TARGET_RATE,
+                  silence_dbfs: float = SILENCE_DBFS) -> Dict:
+    """
+    Gera em dst_path um WAV mono 16 bits em até target_rate Hz sem silêncio nas pontas
+    Retorna estatísticas de tamanho e duração antes/depois
+    """
+    with wave.open(src_path, 'rb') as src:
+        channels = src.getnchannels()
+        sampwidth = src.getsampwidth()
+        src_rate = src.getframerate()
+        src_frames = src.getnframes()
+        # Nunca aumenta a taxa de amostragem
+        out_rate = min(src_rate, target_rate)
+
+        resampler = _StreamResampler(src_rate, out_rate)
+        trimmer = _SilenceTrimmer(out_rate, silence_dbfs)
+        out_frames = 0
+
+        with wave.open(dst_path, 'wb') as dst:
+            dst.setnchannels(1)
+            dst.setsampwidth(2)
+            dst.setframerate(out_rate)
+            while True:
+                raw = src.readframes(CHUNK_FRAMES)
+                if not raw:
+                    break
+                samples = _frames_to_mono(raw, sampwidth, channels)
+                samples = trimmer.process(resampler.process(samples))
+                if len(samples):
+                    dst.writeframes(_to_pcm16(samples))
+                    out_frames += len(samples)
+
+    return {
+        'original_bytes': os.path.getsize(src_path),
+        'output_bytes': os.path.getsize(dst_path),
+        'original_seconds': round(src_frames / src_rate, 2) if src_rate else 0,
+        'output_seconds': round(out_frames / out_rate, 2) if out_rate else 0,
+        'channels': channels,
+        'sample_rate': src_rate,
+        'output_rate': out_rate,
+    }
+
+
+def prepare_audio(file_path: str) -> Tuple[str, Optional[Dict]]:
+    """
+    Normaliza o arquivo antes do envio quando possível
+    Retorna (caminho para enviar, estatísticas); para arquivos que não são WAV,
+    WAV inválido ou sem ganho de tamanho, retorna o caminho original e None
+    """
+    if not file_path.lower().endswith('.wav'):
+        return file_path, None
+
+    base, _ = os.path.splitext(file_path)
+    dst_path = f"{base}.norm.wav"
+    try:
+        stats = normalize_wav(file_path, dst_path)
+    except (wave.Error, ValueError, EOFError) as e:
+        print(f"Normalização ignorada para {file_path}: {e}")
+        if os.path.exists(dst_path):
+            os.remove(dst_path)
+        return file_path, None
+
+    # Arquivo só com silêncio ou já compacto: envia o original
+    if stats['output_seconds'] <= 0 or stats['output_bytes'] >= stats['original_bytes']:
+        os.remove(dst_path)
+        return file_path, None
+    return dst_path, stats
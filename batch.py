@@ -0,0 +1,181 @@
+"""
+Batch.py - Processamento em lote de áudios para o Monitor.AI
+Executa o pipeline upload → transcrição → relatório para vários arquivos,
+com limite de concorrência independente para cada etapa
+"""
+
+import os
+import queue
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Extensões aceitas dentro de um arquivo ZIP
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.m4a', '.ogg', '.flac', '.aac', '.wma')
+
+# Limite de arquivos por lote (protege disco e cotas das APIs)
+MAX_BATCH_FILES = int(os.environ.get('BATCH_MAX_FILES', 200))
+
+# Limite de bytes descompactados por lote (um ZIP pequeno pode encher o disco)
+MAX_BATCH_BYTES = int(os.environ.get('BATCH_MAX_BYTES', 2 * 1024 ** 3))
+
+COPY_CHUNK = 1024 * 1024
+
+
+class BatchLimitError(ValueError):
+    """Lote excede o limite de tamanho"""
+
+
+def is_audio_file(filename: str) -> bool:
+    """Verifica pela extensão se o arquivo é um áudio suportado"""
+    return filename.lower().endswith(AUDIO_EXTENSIONS)
+
+
+def unique_path(directory: str, filename: str) -> str:
+    """Retorna um caminho livre em directory, numerando nomes repetidos"""
+    base, ext = os.path.splitext(filename)
+    candidate = os.path.join(directory, filename)
+    counter = 1
+    while os.path.exists(candidate):
+        candidate = os.path.join(directory, f"{base}_{counter}{ext}")
+        counter += 1
+    return candidate
+
+
+def extract_zip(zip_path: str, destination: str, limit: int = MAX_BATCH_FILES,
+                max_bytes: int = MAX_BATCH_BYTES) -> List[str]:
+    """
+    Extrai os áudios de um ZIP para destination
+    Ignora pastas, arquivos que não são áudio e caminhos internos do ZIP
+    Levanta BatchLimitError se os áudios passarem de max_bytes descompactados;
+    o tamanho declarado no ZIP é conferido antes e os bytes contados na cópia,
+    já que o cabeçalho pode mentir
+    """
+    extracted = []
+    written = 0
+    with zipfile.ZipFile(zip_path) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            filename = os.path.basename(info.filename)
+            if not filename or not is_audio_file(filename):
+                continue
+            if len(extracted) >= limit:
+                break
+            if written + info.file_size > max_bytes:
+                raise BatchLimitError(f'Lote excede {max_bytes} bytes descompactados')
+            target = unique_path(destination, filename)
+            with archive.open(info) as src, open(target, 'wb') as dst:
+                while True:
+                    chunk = src.read(COPY_CHUNK)
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if written > max_bytes:
+                        raise BatchLimitError(f'Lote excede {max_bytes} bytes descompactados')
+                    dst.write(chunk)
+            extracted.append(target)
+    return extracted
+
+
+class BatchPipeline:
+    """
+    Pipeline em etapas com um semáforo por etapa
+
+    Cada arquivo percorre as etapas em ordem; a saída de uma etapa é a entrada
+    da próxima. O número de arquivos simultâneos em cada etapa é limitado de
+    forma independente, então a transcrição (I/O) pode ter mais vagas que o
+    relatório (limitado pela cota do LLM). Com `slots` (ver admission.BatchSlots),
+    cada arquivo também ocupa uma vaga de admissão enquanto é processado.
+    """
+
+    def __init__(self, stages: List[Tuple[str, Callable]], limits: Dict[str, int],
+                 on_stage_done: Optional[Callable[[str, float], None]] = None,
+                 slots=None):
+        self.stages = stages
+        self.on_stage_done = on_stage_done
+        self.slots = slots
+        self.limits = {name: max(1, int(limits.get(name, 1))) for name, _ in stages}
+        self._semaphores = {
+            name: threading.BoundedSemaphore(limit) for name, limit in self.limits.items()
+        }
+
+    def _process(self, name: str, path: str, events: queue.Queue, stop: threading.Event):
+        """
+        Executa todas as etapas para um arquivo, publicando eventos na fila
+        Para entre etapas se `stop` for sinalizado (cliente desconectou)
+        """
+        release = None
+        if self.slots is not None:
+            release = self.slots.acquire(stop)
+            if release is None:
+                return
+        try:
+            self._run_stages(name, path, events, stop)
+        finally:
+            if release is not None:
+                release()
+
+    def _run_stages(self, name: str, path: str, events: queue.Queue, stop: threading.Event):
+        value = path
+        for stage_name, func in self.stages:
+            if stop.is_set():
+                return
+            events.put({'event': 'etapa', 'arquivo': name, 'etapa': stage_name, 'status': 'iniciada'})
+            try:
+                with self._semaphores[stage_name]:
+                    inicio = time.perf_counter()
+                    value = func(value)
+                    if self.on_stage_done:
+                        self.on_stage_done(stage_name, time.perf_counter() - inicio)
+            except Exception as e:
+                events.put({
+                    'event': 'resultado',
+                    'arquivo': name,
+                    'success': False,
+                    'etapa': stage_name,
+                    'erro': str(e)
+                })
+                return
+            events.put({'event': 'etapa', 'arquivo': name, 'etapa': stage_name, 'status': 'concluida'})
+        events.put({'event': 'resultado', 'arquivo': name, 'success': True, 'resultado': value})
+
+    def run(self, items: List[Tuple[str, str]]) -> Iterator[Dict]:
+        """
+        Processa items [(nome, caminho), ...] e gera eventos conforme acontecem
+        Os resultados parciais saem assim que cada arquivo termina
+        """
+        total = len(items)
+        yield {'event': 'inicio', 'total': total, 'limites': self.limits}
+        if not total:
+            yield {'event': 'fim', 'total': 0, 'sucesso': 0, 'falhas': 0}
+            return
+
+        events = queue.Queue()
+        stop = threading.Event()
+        workers = min(total, sum(self.limits.values()))
+        finished = succeeded = 0
+
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch')
+        try:
+            for name, path in items:
+                executor.submit(self._process, name, path, events, stop)
+
+            while finished < total:
+                event = events.get()
+                if event['event'] == 'resultado':
+                    finished += 1
+                    succeeded += 1 if event['success'] else 0
+                    event['concluidos'] = finished
+                    event['total'] = total
+                yield event
+        finally:
+            # Se o gerador for fechado antes do fim (GeneratorExit), os arquivos
+            # que não começaram são cancelados e os em andamento param na
+            # próxima etapa, em vez de chamar as APIs para ninguém
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        yield {'event': 'fim', 'total': total, 'sucesso': succeeded, 'falhas': total - succeeded}
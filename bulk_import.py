@@ -0,0 +1,208 @@
+"""
+Bulk_import.py - Importação de usuários em lote para o Monitor.AI
+Valida o lote inteiro, confere duplicados com uma única consulta, gera os
+hashes de senha em paralelo (pool de processos) e grava tudo em uma transação
+"""
+
+import csv
+import io
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Tuple
+
+from werkzeug.security import generate_password_hash
+
+MAX_IMPORT_ROWS = int(os.environ.get('BULK_IMPORT_MAX_ROWS', 5000))
+HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+
+REQUIRED_FIELDS = ('username', 'email', 'password')
+TRUE_VALUES = ('1', 'true', 'sim', 'yes')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hash_pool() -> ProcessPoolExecutor:
+    """Pool criado no primeiro uso; spawn evita fork de um servidor com threads"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=HASH_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+
+def _discard_hash_pool(pool: ProcessPoolExecutor):
+    """Descarta um pool quebrado (worker morto); o próximo uso cria outro"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """Hash das senhas no pool; se um worker morreu, recria o pool e tenta de novo uma vez"""
+    chunksize = max(1, len(passwords) // (HASH_WORKERS * 4))
+    for attempt in range(2):
+        pool = get_hash_pool()
+        try:
+            return list(pool.map(generate_password_hash, passwords, chunksize=chunksize))
+        except BrokenProcessPool:
+            _discard_hash_pool(pool)
+            if attempt:
+                raise
+
+
+def parse_payload(content_type: str, body: bytes) -> List[Dict[str, Any]]:
+    """Lê o lote em JSON (lista ou {"users": [...]}) ou CSV com cabeçalho"""
+    if 'csv' in (content_type or ''):
+        reader = csv.DictReader(io.StringIO(body.decode('utf-8-sig')))
+        return [{k.strip(): (v or '').strip() for k, v in row.items() if k} for row in reader]
+
+    data = json.loads(body or b'null')
+    if isinstance(data, dict):
+        data = data.get('users')
+    if not isinstance(data, list):
+        raise ValueError('Envie uma lista de usuários (JSON) ou um CSV com cabeçalho')
+    return data
+
+
+def _as_bool(value: Any, default: bool = True) -> bool:
+    if value is None or value == '':
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE_VALUES
+    return bool(value)
+
+
+def validate_rows(rows: List[Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Separa linhas válidas e erros (linha numerada a partir de 1)
+    Também rejeita usuário ou email repetido dentro do próprio lote
+    """
+    valid, errors = [], []
+    seen_usernames, seen_emails = set(), set()
+
+    for index, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({'row': index, 'error': 'Linha inválida'})
+            continue
+        missing = [field for field in REQUIRED_FIELDS if not str(row.get(field) or '').strip()]
+        if missing:
+            errors.append({
+                'row': index,
+                'username': row.get('username'),
+                'error': f"Campo {', '.join(missing)} é obrigatório"
+            })
+            continue
+
+        username = str(row['username']).strip()
+        email = str(row['email']).strip()
+        if username in seen_usernames or email in seen_emails:
+            errors.append({'row': index, 'username': username, 'error': 'Usuário ou email repetido no lote'})
+            continue
+        seen_usernames.add(username)
+        seen_emails.add(email)
+
+        role = str(row.get('role') or 'user').strip()
+        shift = str(row.get('shift') or '').strip() or None
+        valid.append({
+            'row': index,
+            'username': username,
+            'email': email,
+            'password': str(row['password']),
+            'role': role,
+            'active': _as_bool(row.get('active')),
+            'shift': shift,
+            # Operadores ganham a linha em operators junto com o usuário
+            'operator': role == 'operator' or shift is not None
+        })
+
+    return valid, errors
+
+
+def find_existing(cursor, rows: List[Dict[str, Any]]) -> Tuple[set, set]:
+    """Usuários e emails do lote que já existem, em uma única consulta"""
+    usernames = json.dumps([row['username'] for row in rows])
+    emails = json.dumps([row['email'] for row in rows])
+    cursor.execute('''
+        SELECT username, email FROM users
+        WHERE username IN (SELECT value FROM json_each(?))
+           OR email IN (SELECT value FROM json_each(?))
+    ''', (usernames, emails))
+    existing = cursor.fetchall()
+    return {row[0] for row in existing}, {row[1] for row in existing}
+
+
+def import_users(database: str, rows: List[Any]) -> Dict[str, Any]:
+    """Executa a importação completa e devolve criados e erros por linha"""
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise ValueError(f'Máximo de {MAX_IMPORT_ROWS} usuários por importação')
+
+    valid, errors = validate_rows(rows)
+
+    conn = sqlite3.connect(database)
+    cursor = conn.cursor()
+    try:
+        if valid:
+            existing_usernames, existing_emails = find_existing(cursor, valid)
+            pending = []
+            for row in valid:
+                if row['username'] in existing_usernames or row['email'] in existing_emails:
+                    errors.append({'row': row['row'], 'username': row['username'],
+                                   'error': 'Usuário ou email já existe'})
+                else:
+                    pending.append(row)
+            valid = pending
+
+        if not valid:
+            return {'created': [], 'errors': sorted(errors, key=lambda e: e['row'])}
+
+        # Hash fora da thread da requisição e fora da transação
+        hashes = hash_passwords([row['password'] for row in valid])
+
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.executemany('''
+            INSERT INTO users (username, email, password_hash, role, active)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [
+            (row['username'], row['email'], password_hash, row['role'], row['active'])
+            for row, password_hash in zip(valid, hashes)
+        ])
+
+        cursor.execute('''
+            SELECT username, id FROM users
+            WHERE username IN (SELECT value FROM json_each(?))
+        ''', (json.dumps([row['username'] for row in valid]),))
+        ids = dict(cursor.fetchall())
+
+        cursor.executemany('''
+            INSERT INTO operators (user_id, shift, active)
+            VALUES (?, ?, ?)
+        ''', [
+            (ids[row['username']], row['shift'], row['active'])
+            for row in valid if row['operator']
+        ])
+        conn.commit()
+    except sqlite3.IntegrityError:
+        # Outro cadastro entrou entre a verificação e a gravação
+        conn.rollback()
+        raise ValueError('Conflito com cadastro simultâneo, tente novamente')
+    finally:
+        conn.close()
+
+    created = [{
+        'row': row['row'],
+        'user_id': ids[row['username']],
+        'username': row['username'],
+        'operator': row['operator']
+    } for row in valid]
+    return {'created': created, 'errors': sorted(errors, key=lambda e: e['row'])}
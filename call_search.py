@@ -0,0 +1,176 @@
+"""
+Call_search.py - Busca textual em transcrições e relatórios do Monitor.AI
+Índice FTS5 com conteúdo externo (tabela calls), sincronizado por triggers
+"""
+
+import html
+import re
+from typing import Any, Dict, List, Tuple
+
+# Marcadores usados nos trechos destacados
+SNIPPET_OPEN = '<mark>'
+SNIPPET_CLOSE = '</mark>'
+SNIPPET_TOKENS = 16
+
+# O snippet() do FTS5 devolve o texto cru: o destaque sai com estes caracteres
+# de uso privado, o trecho é escapado e só então eles viram <mark>/</mark>
+_SENTINEL_OPEN = '\ue000'
+_SENTINEL_CLOSE = '\ue001'
+
+# Campos pesquisáveis e peso de cada um no bm25 (transcrição pesa mais)
+SEARCH_FIELDS = {'transcript': 0, 'analysis_result': 1}
+BM25_WEIGHTS = (1.0, 0.6)
+
+_TOKEN_PATTERN = re.compile(r'"[^"]*"|\S+')
+
+
+def create_tables(cursor):
+    """Cria o índice FTS5 e os triggers; reconstrói o índice se ele for novo"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'calls_fts'")
+    exists = cursor.fetchone() is not None
+
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS calls_fts USING fts5(
+            transcript,
+            analysis_result,
+            content = 'calls',
+            content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS calls_fts_insert AFTER INSERT ON calls BEGIN
+            INSERT INTO calls_fts (rowid, transcript, analysis_result)
+            VALUES (new.id, new.transcript, new.analysis_result);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS calls_fts_delete AFTER DELETE ON calls BEGIN
+            INSERT INTO calls_fts (calls_fts, rowid, transcript, analysis_result)
+            VALUES ('delete', old.id, old.transcript, old.analysis_result);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS calls_fts_update
+        AFTER UPDATE OF transcript, analysis_result ON calls BEGIN
+            INSERT INTO calls_fts (calls_fts, rowid, transcript, analysis_result)
+            VALUES ('delete', old.id, old.transcript, old.analysis_result);
+            INSERT INTO calls_fts (rowid, transcript, analysis_result)
+            VALUES (new.id, new.transcript, new.analysis_result);
+        END
+    ''')
+
+    if not exists:
+        cursor.execute("INSERT INTO calls_fts (calls_fts) VALUES ('rebuild')")
+
+
+def call_filters(args) -> Tuple[List[str], List[Any]]:
+    """
+    Filtros comuns da listagem e da busca de chamadas (alias c = calls)
+    Aceita operator_id, conformity, alert_pending, date_from e date_to
+    """
+    where, params = [], []
+
+    operator_id = args.get('operator_id', type=int)
+    if operator_id is not None:
+        where.append('c.operator_id = ?')
+        params.append(operator_id)
+
+    for flag in ('conformity', 'alert_pending'):
+        value = args.get(flag)
+        if value is not None and value != '':
+            where.append(f'c.{flag} = ?')
+            params.append(1 if value.lower() in ('1', 'true', 'sim') else 0)
+
+    if args.get('date_from'):
+        where.append('c.created_at >= ?')
+        params.append(args['date_from'])
+    if args.get('date_to'):
+        where.append('c.created_at < ?')
+        # Datas sem horário incluem o dia inteiro
+        date_to = args['date_to']
+        params.append(date_to + ' 23:59:59.999' if len(date_to) == 10 else date_to)
+
+    return where, params
+
+
+def to_fts_query(text: str) -> str:
+    """
+    Converte a busca do usuário em uma expressão FTS5 segura
+    Palavras viram termos entre aspas (E implícito), "frases" são mantidas,
+    OR é preservado e termo* vira busca por prefixo
+    """
+    terms = []
+    for token in _TOKEN_PATTERN.findall(text or ''):
+        if token == 'AND':
+            continue
+        if token == 'OR':
+            if terms and terms[-1] != 'OR':
+                terms.append(token)
+            continue
+        prefix = token.endswith('*') and not token.startswith('"')
+        word = token.strip('"').rstrip('*').replace('"', '')
+        if not word.strip():
+            continue
+        terms.append(f'"{word}"' + ('*' if prefix else ''))
+    while terms and terms[-1] == 'OR':
+        terms.pop()
+    return ' '.join(terms)
+
+
+def highlight(snippet):
+    """Trecho do FTS em HTML seguro: texto escapado, só os destaques como <mark>"""
+    if snippet is None:
+        return None
+    return (html.escape(snippet)
+            .replace(_SENTINEL_OPEN, SNIPPET_OPEN)
+            .replace(_SENTINEL_CLOSE, SNIPPET_CLOSE))
+
+
+def search_calls(cursor, query: str, args, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+    """Busca ranqueada (bm25) com trechos destacados dos dois campos"""
+    match = to_fts_query(query)
+    if not match:
+        return []
+
+    field = args.get('field')
+    if field in SEARCH_FIELDS:
+        match = f'{field} : ({match})'
+
+    where, params = call_filters(args)
+    where.insert(0, 'calls_fts MATCH ?')
+    params.insert(0, match)
+
+    cursor.execute(f'''
+        SELECT c.id, c.operator_id, u.username, c.duration, c.conformity, c.alert_pending,
+               c.score, c.created_at,
+               bm25(calls_fts, ?, ?) AS rank,
+               snippet(calls_fts, 0, ?, ?, '…', ?),
+               snippet(calls_fts, 1, ?, ?, '…', ?)
+        FROM calls_fts
+        JOIN calls c ON c.id = calls_fts.rowid
+        LEFT JOIN users u ON u.id = c.operator_id
+        WHERE {' AND '.join(where)}
+        ORDER BY rank
+        LIMIT ? OFFSET ?
+    ''', [
+        *BM25_WEIGHTS,
+        _SENTINEL_OPEN, _SENTINEL_CLOSE, SNIPPET_TOKENS,
+        _SENTINEL_OPEN, _SENTINEL_CLOSE, SNIPPET_TOKENS,
+        *params,
+        limit, offset
+    ])
+
+    return [{
+        'id': row[0],
+        'operator_id': row[1],
+        'operator_name': row[2],
+        'duration': row[3],
+        'conformity': bool(row[4]),
+        'alert_pending': bool(row[5]),
+        'score': row[6],
+        'created_at': row[7],
+        'rank': round(row[8], 4),
+        'transcript_snippet': highlight(row[9]),
+        'analysis_snippet': highlight(row[10])
+    } for row in cursor.fetchall()]
@@ -0,0 +1,167 @@
+"""
+Corpus.py - Gravação incremental do corpus de treinamento do Monitor.AI
+Grava as páginas coletadas em um JSONL só de acréscimo, descartando parágrafos,
+produtos e promoções já vistos (hashes persistidos em disco), com compressão
+opcional e índice de posições para leitura aleatória de qualquer registro
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import struct
+
+# Entrada do índice: posição inicial e tamanho (em bytes no arquivo) do registro
+INDEX_ENTRY = struct.Struct('<QI')
+
+# blake2b de 8 bytes: colisão só se torna provável na casa dos bilhões de itens
+DIGEST_SIZE = 8
+
+# Listas da página que passam pelo descarte de duplicados
+DEDUPED_FIELDS = ('text_content', 'products', 'promotions')
+
+
+def content_hash(item):
+    """Hash do conteúdo; espaços extras e ordem das chaves não contam"""
+    if isinstance(item, str):
+        canonical = ' '.join(item.split())
+    else:
+        canonical = json.dumps(item, ensure_ascii=False, sort_keys=True)
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=DIGEST_SIZE).digest()
+
+
+def _paths(path):
+    return path + '.idx', path + '.hashes'
+
+
+class CorpusWriter:
+    """
+    Escritor do corpus (use com `with`)
+
+    Cada registro é uma linha JSON; com gzip, cada linha vira um membro gzip
+    próprio, então o arquivo continua legível por gzip.open e cada registro
+    pode ser descomprimido sozinho a partir da posição no índice.
+    """
+
+    def __init__(self, path, compress=None):
+        self.path = path
+        self.compress = path.endswith('.gz') if compress is None else compress
+        self.index_path, self.hashes_path = _paths(path)
+
+        self._seen = self._load_hashes()
+        self._data = open(path, 'ab')
+        self._index = open(self.index_path, 'ab')
+        self._hashes = open(self.hashes_path, 'ab')
+        self._recover()
+        self.records = self._index.tell() // INDEX_ENTRY.size
+        self.skipped = 0
+
+    def _load_hashes(self):
+        seen = set()
+        try:
+            with open(self.hashes_path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return seen
+        usable = len(raw) - len(raw) % DIGEST_SIZE
+        for start in range(0, usable, DIGEST_SIZE):
+            seen.add(raw[start:start + DIGEST_SIZE])
+        return seen
+
+    def _recover(self):
+        """Descarta o final de uma gravação interrompida (dados sem entrada no índice)"""
+        index_size = self._index.tell()
+        if index_size % INDEX_ENTRY.size:
+            index_size -= index_size % INDEX_ENTRY.size
+            self._index.truncate(index_size)
+
+        end = 0
+        if index_size:
+            with open(self.index_path, 'rb') as f:
+                f.seek(index_size - INDEX_ENTRY.size)
+                offset, length = INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))
+            end = offset + length
+        if self._data.tell() > end:
+            self._data.truncate(end)
+
+        hashes_size = self._hashes.tell()
+        if hashes_size % DIGEST_SIZE:
+            self._hashes.truncate(hashes_size - hashes_size % DIGEST_SIZE)
+
+    def write_page(self, page):
+        """
+        Grava a página só com os itens inéditos; devolve o número do registro
+        ou None se a página não trouxe nada novo
+        """
+        record = dict(page)
+        new_hashes = []
+        for field in DEDUPED_FIELDS:
+            fresh = []
+            for item in page.get(field) or []:
+                digest = content_hash(item)
+                if digest in self._seen:
+                    continue
+                self._seen.add(digest)
+                new_hashes.append(digest)
+                fresh.append(item)
+            record[field] = fresh
+
+        if not new_hashes:
+            self.skipped += 1
+            return None
+
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        if self.compress:
+            line = gzip.compress(line)
+
+        # Dados, depois índice, depois hashes: uma falha no meio no pior caso
+        # deixa itens sem hash (regravados depois), nunca hashes sem registro
+        offset = self._data.tell()
+        self._data.write(line)
+        self._data.flush()
+        self._index.write(INDEX_ENTRY.pack(offset, len(line)))
+        self._index.flush()
+        self._hashes.write(b''.join(new_hashes))
+        self._hashes.flush()
+
+        self.records += 1
+        return self.records - 1
+
+    def close(self):
+        for f in (self._data, self._index, self._hashes):
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def count_records(path):
+    """Quantidade de registros do corpus, pelo tamanho do índice"""
+    index_path, _ = _paths(path)
+    try:
+        return os.path.getsize(index_path) // INDEX_ENTRY.size
+    except FileNotFoundError:
+        return 0
+
+
+def read_record(path, number):
+    """Lê o registro `number` (a partir de 0) sem percorrer o arquivo"""
+    if number < 0:
+        raise IndexError(f'Registro {number} não existe em {path}')
+    index_path, _ = _paths(path)
+    with open(index_path, 'rb') as f:
+        f.seek(number * INDEX_ENTRY.size)
+        entry = f.read(INDEX_ENTRY.size)
+    if len(entry) < INDEX_ENTRY.size:
+        raise IndexError(f'Registro {number} não existe em {path}')
+    offset, length = INDEX_ENTRY.unpack(entry)
+
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        raw = f.read(length)
+    if raw[:2] == b'\x1f\x8b':
+        raw = gzip.decompress(raw)
+    return json.loads(raw)
@@ -4,15 +4,30 @@ Arquivo com funções pré-prontas para cálculos do dashboard
 """
 
 import json
-import random
+import sqlite3
 from datetime import datetime, timedelta
 from typing import Dict, List, Any
 import statistics
 
+from metrics_engine import drilldown, run_metrics
+from retention import archived_until
+
+# Banco padrão (mesmo arquivo usado pelo main.py)
+DATABASE = 'monitor_ai.db'
+
+# Grade do heatmap: horário comercial de segunda a sexta
+HEATMAP_HOURS = list(range(8, 18))
+HEATMAP_DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
+
+# Janela (dias) considerada no heatmap e na tendência
+HEATMAP_WINDOW_DAYS = 30
+TREND_WINDOW_DAYS = 7
+
 class DashboardCalculator:
     """Classe com todas as lógicas de cálculo para o dashboard"""
     
-    def __init__(self):
+    def __init__(self, database: str = DATABASE):
+        self.database = database
         self.data_cache = {}
     
     def calculate_total_calls(self, calls_data: List[Dict]) -> int:
@@ -60,20 +75,25 @@ class DashboardCalculator:
     
     def generate_heatmap_data(self, calls_data: List[Dict]) -> List[Dict]:
         """Gera dados do heatmap de conformidade por horário"""
-        heatmap = []
-        hours = ['08:00', '09:00', '10:00', '11:00', '12:00', '13:00', 
-                '14:00', '15:00', '16:00', '17:00']
-        days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
+        cells = {}
+        for call in calls_data:
+            if not call.get('date'):
+                continue
+            date = datetime.fromisoformat(call['date'])
+            total, conforming = cells.get((date.weekday(), date.hour), (0, 0))
+            cells[(date.weekday(), date.hour)] = (total + 1, conforming + bool(call.get('conformity')))
         
-        for hour in hours:
-            hour_data = {'hour': hour}
-            for day in days:
-                # Simula cálculo baseado em dados reais
-                # Aqui você colocaria a lógica real baseada nos seus dados
-                conformity_rate = random.randint(70, 95)
-                hour_data[day] = conformity_rate
+        rates = {key: round(conforming * 100 / total) for key, (total, conforming) in cells.items()}
+        return self._heatmap_grid(rates)
+    
+    def _heatmap_grid(self, rates: Dict) -> List[Dict]:
+        """Monta a grade hora x dia a partir de {(dia_semana, hora): taxa}"""
+        heatmap = []
+        for hour in HEATMAP_HOURS:
+            hour_data = {'hour': f'{hour:02d}:00'}
+            for weekday, day in enumerate(HEATMAP_DAYS):
+                hour_data[day] = rates.get((weekday, hour), 0)
             heatmap.append(hour_data)
-        
         return heatmap
     
     def calculate_trend_data(self, calls_data: List[Dict], days: int = 7) -> Dict:
@@ -101,16 +121,15 @@ class DashboardCalculator:
                             ai_analysis_data: List[Dict] = None) -> Dict[str, Any]:
         """
         Retorna um resumo completo para o dashboard
-        Se não houver dados, retorna dados simulados
+        Sem listas de dados, calcula direto no banco
         """
         
-        # Se não há dados, gera dados simulados
-        if not calls_data:
-            calls_data = self._generate_mock_calls_data()
-        if not operators_data:
-            operators_data = self._generate_mock_operators_data()
-        if not ai_analysis_data:
-            ai_analysis_data = self._generate_mock_ai_data()
+        if calls_data is None and operators_data is None and ai_analysis_data is None:
+            return self.get_database_summary()
+        
+        calls_data = calls_data or []
+        operators_data = operators_data or []
+        ai_analysis_data = ai_analysis_data or []
         
         return {
             'metrics': {
@@ -126,43 +145,102 @@ class DashboardCalculator:
             'lastUpdate': datetime.now().isoformat()
         }
     
-    def _generate_mock_calls_data(self) -> List[Dict]:
-        """Gera dados simulados de chamadas"""
-        mock_calls = []
-        for i in range(1247):  # Número exemplo
-            mock_calls.append({
-                'id': f'call_{i}',
-                'date': (datetime.now() - timedelta(days=random.randint(0, 30))).isoformat(),
-                'duration': random.randint(120, 600),  # 2-10 minutos em segundos
-                'conformity': random.choice([True, False]),
-                'alert_pending': random.choice([True, False, False, False]),  # 25% chance
-                'operator_id': f'op_{random.randint(1, 50)}'
-            })
-        return mock_calls
+    def get_database_summary(self) -> Dict[str, Any]:
+        """
+        Mesmo resumo de get_dashboard_summary, agregado em SQL
+        Os totais somam os agregados dos meses arquivados (calls_rollup)
+        """
+        now = datetime.now()
+        trend_start = now - timedelta(days=TREND_WINDOW_DAYS)
+        heatmap_start = now - timedelta(days=HEATMAP_WINDOW_DAYS)
+        
+        conn = sqlite3.connect(self.database)
+        try:
+            total, conforming, alerts, duration_total, duration_count, analysed = conn.execute('''
+                SELECT SUM(calls_count), SUM(conformity_count), SUM(alert_count),
+                       SUM(duration_total), SUM(duration_count), SUM(scored_count)
+                FROM (
+                    SELECT COUNT(*) AS calls_count,
+                           COALESCE(SUM(conformity), 0) AS conformity_count,
+                           COALESCE(SUM(alert_pending), 0) AS alert_count,
+                           COALESCE(SUM(duration), 0) AS duration_total,
+                           COUNT(NULLIF(duration, 0)) AS duration_count,
+                           COUNT(score) AS scored_count
+                    FROM calls
+                    UNION ALL
+                    SELECT COALESCE(SUM(calls_count), 0), COALESCE(SUM(conformity_count), 0),
+                           COALESCE(SUM(alert_count), 0), COALESCE(SUM(duration_total), 0),
+                           COALESCE(SUM(duration_count), 0), COALESCE(SUM(scored_count), 0)
+                    FROM calls_rollup
+                )
+            ''').fetchone()
+            avg_duration = duration_total / duration_count if duration_count else None
+            
+            active_operators = conn.execute(
+                'SELECT COUNT(*) FROM operators WHERE active = 1'
+            ).fetchone()[0]
+            
+            trend_total, trend_conforming, trend_duration = conn.execute('''
+                SELECT COUNT(*), COALESCE(SUM(conformity), 0), AVG(NULLIF(duration, 0))
+                FROM calls
+                WHERE created_at >= ? AND created_at <= ?
+            ''', (trend_start.strftime('%Y-%m-%d %H:%M:%S'), now.strftime('%Y-%m-%d %H:%M:%S'))).fetchone()
+            
+            # strftime('%w'): domingo = 0; a grade usa segunda = 0
+            heatmap_rows = conn.execute('''
+                SELECT (CAST(strftime('%w', created_at) AS INTEGER) + 6) % 7,
+                       CAST(strftime('%H', created_at) AS INTEGER),
+                       ROUND(AVG(conformity) * 100)
+                FROM calls
+                WHERE created_at >= ?
+                GROUP BY 1, 2
+            ''', (heatmap_start.strftime('%Y-%m-%d %H:%M:%S'),)).fetchall()
+        finally:
+            conn.close()
+        
+        return {
+            'metrics': {
+                'totalCalls': total,
+                'conformityRate': round(conforming * 100 / total, 1) if total else 0.0,
+                'pendingAlerts': alerts,
+                'avgTime': round(avg_duration / 60, 1) if avg_duration else 0.0,
+                'activeOperators': active_operators,
+                'aiEfficiency': round(analysed * 100 / total, 1) if total else 0.0
+            },
+            'heatmapData': self._heatmap_grid({(row[0], row[1]): int(row[2]) for row in heatmap_rows}),
+            'trends': {
+                'total_calls': trend_total,
+                'conformity_trend': round(trend_conforming * 100 / trend_total, 1) if trend_total else 0.0,
+                'avg_time_trend': round(trend_duration / 60, 1) if trend_duration else 0.0,
+                'period_start': trend_start.isoformat(),
+                'period_end': now.isoformat()
+            },
+            'lastUpdate': now.isoformat()
+        }
     
-    def _generate_mock_operators_data(self) -> List[Dict]:
-        """Gera dados simulados de operadores"""
-        mock_operators = []
-        for i in range(50):
-            mock_operators.append({
-                'id': f'op_{i}',
-                'name': f'Operador {i}',
-                'active': random.choice([True, False]),
-                'shift': random.choice(['morning', 'afternoon', 'night'])
-            })
-        return mock_operators
+    def calculate_custom_metrics(self, definition: Dict) -> Dict:
+        """
+        Executa uma definição de métricas customizadas direto no banco
+        Veja o formato em metrics_engine.py; inclui os meses arquivados do
+        período filtrado, e archived_until indica o último mês arquivado
+        """
+        conn = sqlite3.connect(self.database)
+        try:
+            result = run_metrics(conn, definition)
+            result['archived_until'] = archived_until(conn.cursor())
+            return result
+        finally:
+            conn.close()
     
-    def _generate_mock_ai_data(self) -> List[Dict]:
-        """Gera dados simulados de análises de IA"""
-        mock_ai = []
-        for i in range(500):
-            mock_ai.append({
-                'id': f'analysis_{i}',
-                'success': random.choice([True, False, True, True]),  # 75% sucesso
-                'confidence': random.uniform(0.7, 0.99),
-                'processing_time': random.uniform(0.5, 3.0)
-            })
-        return mock_ai
+    def get_drilldown(self, dimensions: List[str], where: List[str] = None,
+                      params: List[Any] = None, date_from: str = None,
+                      date_to: str = None) -> Dict:
+        """Cubo de métricas por operador/turno/dia/hora com subtotais, incluindo meses arquivados"""
+        conn = sqlite3.connect(self.database)
+        try:
+            return drilldown(conn, dimensions, where, params, date_from, date_to)
+        finally:
+            conn.close()
 
 # Instância global do calculador
 dashboard_calc = DashboardCalculator()
@@ -172,13 +250,8 @@ def get_dashboard_data():
     return dashboard_calc.get_dashboard_summary()
 
 def calculate_custom_metrics(data: Dict) -> Dict:
-    """Calcula métricas customizadas baseadas em dados específicos"""
-    # Aqui você pode adicionar cálculos específicos do seu negócio
-    return {
-        'custom_metric_1': 0,
-        'custom_metric_2': 0,
-        'calculated_at': datetime.now().isoformat()
-    }
+    """Calcula métricas customizadas a partir de uma definição declarativa"""
+    return dashboard_calc.calculate_custom_metrics(data)
 
 if __name__ == "__main__":
     # Teste das funções
@@ -0,0 +1,100 @@
+"""
+Fanout.py - Distribuição de eventos Socket.IO entre processos do Monitor.AI
+Client manager do python-socketio que usa um arquivo SQLite local como fila
+de mensagens, permitindo vários workers sem Redis ou outro broker externo
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+import socketio
+
+# Intervalo entre verificações de mensagens novas (segundos)
+POLL_INTERVAL = float(os.environ.get('SOCKETIO_POLL_INTERVAL', 0.02))
+
+# Mensagens mais antigas que isso são removidas da fila (segundos)
+MESSAGE_RETENTION = 60
+
+# A limpeza roda a cada N publicações
+CLEANUP_EVERY = 500
+
+
+class SQLiteManager(socketio.PubSubManager):
+    """
+    Pub/sub sobre uma tabela SQLite compartilhada pelos workers da máquina
+
+    Cada publicação é uma linha nova; cada worker acompanha o último id lido.
+    PRAGMA data_version só muda quando outra conexão grava, então a espera
+    ociosa não chega a consultar a tabela.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path='socketio_queue.db', channel='socketio',
+                 write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.path = path
+        self._local = threading.local()
+        self._published = 0
+        conn = self._connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS socketio_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                payload BLOB NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_socketio_messages_created '
+                     'ON socketio_messages (created_at)')
+
+    def _connection(self):
+        """Uma conexão por thread (publicações vêm das threads de requisição)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _publish(self, data):
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            'INSERT INTO socketio_messages (channel, created_at, payload) VALUES (?, ?, ?)',
+            (self.channel, now, pickle.dumps(data))
+        )
+        self._published += 1
+        if self._published % CLEANUP_EVERY == 0:
+            conn.execute('DELETE FROM socketio_messages WHERE created_at < ?',
+                         (now - MESSAGE_RETENTION,))
+
+    def _sleep(self, seconds):
+        if self.server is not None:
+            self.server.sleep(seconds)
+        else:
+            time.sleep(seconds)
+
+    def _listen(self):
+        conn = self._connection()
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM socketio_messages').fetchone()[0]
+        version = None
+        while True:
+            current = conn.execute('PRAGMA data_version').fetchone()[0]
+            if current == version:
+                self._sleep(POLL_INTERVAL)
+                continue
+            version = current
+
+            rows = conn.execute(
+                'SELECT id, payload FROM socketio_messages '
+                'WHERE id > ? AND channel = ? ORDER BY id',
+                (last_id, self.channel)
+            ).fetchall()
+            for message_id, payload in rows:
+                last_id = message_id
+                yield pickle.loads(payload)
@@ -0,0 +1,53 @@
+"""
+Gunicorn.conf.py - Configuração do modo produção do Monitor.AI
+Uso: gunicorn -c gunicorn.conf.py 'main:create_app()'   (ou python main.py --workers N)
+"""
+
+import json
+import multiprocessing
+import os
+import time
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+
+# Threads por worker: cada conexão websocket ocupa uma thread
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 100))
+
+# Conexões websocket são longas; o timeout só vale para workers travados
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+
+# Fila local que distribui eventos Socket.IO entre os workers (lida pelo main.py)
+os.environ.setdefault('SOCKETIO_QUEUE', os.path.join(os.getcwd(), 'socketio_queue.db'))
+
+# Tempos de inicialização de cada worker, em JSONL (usado pelo startup_bench.py)
+STARTUP_TIMING_LOG = os.environ.get('STARTUP_TIMING_LOG')
+
+
+def on_starting(server):
+    """Esquema e admin uma única vez, no processo mestre, antes dos workers"""
+    from main import DATABASE, setup_database
+    setup_database(DATABASE)
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.time()
+
+
+def post_worker_init(worker):
+    worker.app_loaded_at = time.time()
+
+
+def pre_request(worker, req):
+    if not STARTUP_TIMING_LOG or getattr(worker, 'first_request_at', None):
+        return
+    worker.first_request_at = time.time()
+    with open(STARTUP_TIMING_LOG, 'a') as f:
+        f.write(json.dumps({
+            'pid': worker.pid,
+            'forked_at': worker.forked_at,
+            'app_loaded_at': worker.app_loaded_at,
+            'first_request_at': worker.first_request_at
+        }) + '\n')
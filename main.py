@@ -3,33 +3,70 @@ Main.py - Arquivo Principal do Backend Monitor.AI
 Sistema de rotas e endpoints principais
 """
 
-from flask import Flask, request, jsonify, render_template
+from flask import Blueprint, Flask, current_app, request, jsonify, render_template
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, join_room
+import argparse
 import json
 import os
+import sys
 from datetime import datetime
 import sqlite3
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # Imports locais
 from dash import DashboardCalculator
+import bulk_import
+import call_search
+import operator_stats
+import retention
+from fanout import SQLiteManager
 # from audio import app as audio_app  # Importa o app de áudio existente (comentado para evitar conflitos)
 
-# Configuração do Flask
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'monitor-ai-secret-key-2024'
-CORS(app, origins=["http://localhost:3000"])
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Rotas e eventos; o app é montado em create_app
+bp = Blueprint('api', __name__)
+socketio = SocketIO()
 
 # Configuração do banco de dados
-DATABASE = 'monitor_ai.db'
+DATABASE = os.environ.get('MONITOR_DATABASE', 'monitor_ai.db')
 
-def init_database():
-    """Inicializa o banco de dados com tabelas necessárias"""
-    conn = sqlite3.connect(DATABASE)
+# Versão do esquema gravada em PRAGMA user_version; aumentar ao mudar init_database
+SCHEMA_VERSION = 3
+
+def load_config():
+    """Configuração do backend a partir das variáveis de ambiente"""
+    return {
+        # Sem padrão: o Flask recusa usar a sessão se SECRET_KEY não estiver definida
+        'SECRET_KEY': os.environ.get('SECRET_KEY'),
+        'DATABASE': DATABASE,
+        'CORS_ORIGINS': os.environ.get('CORS_ORIGINS', 'http://localhost:3000').split(','),
+        # Com vários workers (ver gunicorn.conf.py) os eventos passam por uma fila SQLite local
+        'SOCKETIO_QUEUE': os.environ.get('SOCKETIO_QUEUE'),
+    }
+
+def get_db():
+    """Conexão com o banco do app atual"""
+    return sqlite3.connect(current_app.config['DATABASE'])
+
+def ensure_column(cursor, table, column, definition):
+    """Adiciona a coluna à tabela se ela ainda não existir"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+def init_database(database=DATABASE, force=False):
+    """
+    Inicializa o banco de dados com tabelas necessárias
+    Bancos já na versão atual do esquema são pulados (force=True recria o que faltar)
+    """
+    conn = sqlite3.connect(database)
     cursor = conn.cursor()
     
+    cursor.execute('PRAGMA user_version')
+    if cursor.fetchone()[0] >= SCHEMA_VERSION and not force:
+        conn.close()
+        return False
+    
     # Tabela de usuários
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -70,13 +107,65 @@ def init_database():
             FOREIGN KEY (user_id) REFERENCES users (id)
         )
     ''')
-    
+
+    # Migrações de colunas em bancos já existentes
+    ensure_column(cursor, 'calls', 'score', 'REAL')
+    ensure_column(cursor, 'calls', 'transcript', 'TEXT')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_calls_created_at ON calls (created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_calls_operator ON calls (operator_id, created_at)')
+
+    # Índice de busca textual (transcrição e relatório)
+    call_search.create_tables(cursor)
+
+    # Agregados e registro das partições de chamadas arquivadas
+    retention.create_tables(cursor)
+
+    # Estatísticas por operador (ranking)
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'operator_stats'")
+    stats_exists = cursor.fetchone() is not None
+    operator_stats.create_tables(cursor)
+    if not stats_exists:
+        operator_stats.rebuild(cursor)
+
+    cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
     conn.commit()
     conn.close()
+    return True
+
+def seed_admin(database=DATABASE):
+    """Cria o usuário admin padrão se não existir"""
+    conn = sqlite3.connect(database)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id FROM users WHERE username = ?', ('admin',))
+        if cursor.fetchone():
+            return False
+        password_hash = generate_password_hash('admin123')
+        cursor.execute('''
+            INSERT INTO users (username, email, password_hash, role, active)
+            VALUES (?, ?, ?, ?, ?)
+        ''', ('admin', 'admin@monitor.ai', password_hash, 'admin', True))
+        conn.commit()
+        return True
+    finally:
+        conn.close()
+
+def setup_database(database=DATABASE):
+    """
+    Esquema e usuário admin; roda uma vez por implantação (hook on_starting do
+    gunicorn ou python main.py), não em cada worker
+    """
+    if init_database(database):
+        print("✓ Banco de dados inicializado")
+    try:
+        if seed_admin(database):
+            print("✓ Usuário admin criado (admin/admin123)")
+    except Exception as e:
+        print(f"Erro ao criar usuário admin: {e}")
 
 # ==================== ROTAS PRINCIPAIS ====================
 
-@app.route('/')
+@bp.route('/')
 def home():
     """Rota principal - informações da API"""
     return jsonify({
@@ -87,6 +176,7 @@ def home():
             'dashboard': '/api/dashboard',
             'users': '/api/users',
             'calls': '/api/calls',
+            'monthly': '/api/calls/monthly',
             'operators': '/api/operators',
             'audio': '/upload',
             'websocket': '/socket.io'
@@ -95,12 +185,12 @@ def home():
 
 # ==================== ROTAS DO DASHBOARD ====================
 
-@app.route('/api/dashboard', methods=['GET'])
+@bp.route('/api/dashboard', methods=['GET'])
 def get_dashboard():
     """Endpoint para dados do dashboard"""
     try:
-        calculator = DashboardCalculator()
-        data = calculator.get_dashboard_data()
+        calculator = DashboardCalculator(current_app.config['DATABASE'])
+        data = calculator.get_dashboard_summary()
         return jsonify({
             'success': True,
             'data': data,
@@ -112,17 +202,52 @@ def get_dashboard():
             'error': str(e)
         }), 500
 
-@app.route('/api/dashboard/metrics', methods=['POST'])
+@bp.route('/api/dashboard/metrics', methods=['POST'])
 def calculate_metrics():
     """Endpoint para cálculos customizados"""
     try:
         data = request.get_json()
-        calculator = DashboardCalculator()
+        calculator = DashboardCalculator(current_app.config['DATABASE'])
         metrics = calculator.calculate_custom_metrics(data)
         return jsonify({
             'success': True,
             'metrics': metrics
         })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@bp.route('/api/dashboard/drilldown', methods=['GET'])
+def get_drilldown():
+    """Totais, conformidade, alertas e tempo médio por dimensões, com subtotais"""
+    try:
+        dims = request.args.get('dims', '')
+        dimensions = [d.strip() for d in dims.split(',') if d.strip()]
+        
+        where, params = call_search.call_filters(request.args)
+        if request.args.get('shift'):
+            where.append('o.shift = ?')
+            params.append(request.args['shift'])
+        
+        calculator = DashboardCalculator(current_app.config['DATABASE'])
+        cube = calculator.get_drilldown(dimensions, where, params,
+                                        request.args.get('date_from'), request.args.get('date_to'))
+        return jsonify({
+            'success': True,
+            'data': cube
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -131,11 +256,11 @@ def calculate_metrics():
 
 # ==================== ROTAS DE USUÁRIOS ====================
 
-@app.route('/api/users', methods=['GET'])
+@bp.route('/api/users', methods=['GET'])
 def get_users():
     """Lista todos os usuários"""
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute('''
             SELECT id, username, email, role, active, created_at, last_login 
@@ -167,7 +292,7 @@ def get_users():
             'error': str(e)
         }), 500
 
-@app.route('/api/users', methods=['POST'])
+@bp.route('/api/users', methods=['POST'])
 def create_user():
     """Cria um novo usuário"""
     try:
@@ -182,7 +307,7 @@ def create_user():
                     'error': f'Campo {field} é obrigatório'
                 }), 400
         
-        conn = sqlite3.connect(DATABASE)
+        conn = get_db()
         cursor = conn.cursor()
         
         # Verifica se usuário já existe
@@ -230,13 +355,51 @@ def create_user():
             'error': str(e)
         }), 500
 
-@app.route('/api/users/<int:user_id>', methods=['PUT'])
+@bp.route('/api/users/bulk', methods=['POST'])
+def import_users():
+    """Importa usuários em lote (JSON ou CSV), criando também os operadores"""
+    try:
+        rows = bulk_import.parse_payload(request.content_type, request.get_data())
+        if not rows:
+            return jsonify({
+                'success': False,
+                'error': 'Nenhum usuário enviado'
+            }), 400
+        
+        result = bulk_import.import_users(current_app.config['DATABASE'], rows)
+        created = result['created']
+        
+        if created:
+            socketio.emit('users_imported', {
+                'count': len(created),
+                'user_ids': [user['user_id'] for user in created]
+            })
+        
+        return jsonify({
+            'success': bool(created),
+            'message': f'{len(created)} usuários criados, {len(result["errors"])} com erro',
+            'created': created,
+            'errors': result['errors']
+        }), 201 if created else 400
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@bp.route('/api/users/<int:user_id>', methods=['PUT'])
 def update_user(user_id):
     """Atualiza um usuário"""
     try:
         data = request.get_json()
         
-        conn = sqlite3.connect(DATABASE)
+        conn = get_db()
         cursor = conn.cursor()
         
         # Verifica se usuário existe
@@ -278,11 +441,11 @@ def update_user(user_id):
             'error': str(e)
         }), 500
 
-@app.route('/api/users/<int:user_id>', methods=['DELETE'])
+@bp.route('/api/users/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
     """Remove um usuário"""
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('DELETE FROM users WHERE id = ?', (user_id,))
@@ -309,20 +472,18 @@ def delete_user(user_id):
 
 # ==================== ROTAS DE CHAMADAS ====================
 
-@app.route('/api/calls', methods=['GET'])
+@bp.route('/api/calls', methods=['GET'])
 def get_calls():
-    """Lista todas as chamadas"""
+    """Lista as chamadas, com filtros opcionais e paginação"""
     try:
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT c.*, u.username as operator_name
-            FROM calls c
-            LEFT JOIN users u ON c.operator_id = u.id
-            ORDER BY c.created_at DESC
-            LIMIT 100
-        ''')
-        calls = cursor.fetchall()
+        where, params = call_search.call_filters(request.args)
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 500)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        
+        # Inclui as partições arquivadas que cruzam o período pedido
+        conn = get_db()
+        calls = retention.list_calls(conn, where, params, limit, offset,
+                                     request.args.get('date_from'), request.args.get('date_to'))
         conn.close()
         
         calls_list = []
@@ -336,7 +497,8 @@ def get_calls():
                 'alert_pending': bool(call[4]),
                 'audio_file': call[5],
                 'analysis_result': call[6],
-                'created_at': call[7]
+                'created_at': call[7],
+                'score': call[9]
             })
         
         return jsonify({
@@ -350,6 +512,180 @@ def get_calls():
             'error': str(e)
         }), 500
 
+@bp.route('/api/calls', methods=['POST'])
+def create_call():
+    """Registra uma chamada analisada e atualiza as estatísticas do operador"""
+    try:
+        data = request.get_json()
+        
+        if not data or data.get('operator_id') is None:
+            return jsonify({
+                'success': False,
+                'error': 'Campo operator_id é obrigatório'
+            }), 400
+        
+        # Nota explícita ou extraída do relatório da IA
+        score = data.get('score')
+        if score is None:
+            score = operator_stats.extract_grade(data.get('analysis_result'))
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO calls (operator_id, duration, conformity, alert_pending,
+                               audio_file, analysis_result, transcript, score, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+        ''', (
+            data['operator_id'],
+            data.get('duration'),
+            bool(data.get('conformity', False)),
+            bool(data.get('alert_pending', False)),
+            data.get('audio_file'),
+            data.get('analysis_result'),
+            data.get('transcript'),
+            score,
+            data.get('created_at')
+        ))
+        call_id = cursor.lastrowid
+        
+        # Mesma transação: chamada e estatísticas do operador
+        operator_stats.record_call(
+            cursor,
+            data['operator_id'],
+            data.get('duration'),
+            data.get('conformity', False),
+            score,
+            data.get('created_at')
+        )
+        conn.commit()
+        conn.close()
+        
+        socketio.emit('call_created', {
+            'call_id': call_id,
+            'operator_id': data['operator_id']
+        })
+        
+        return jsonify({
+            'success': True,
+            'message': 'Chamada registrada com sucesso',
+            'call_id': call_id,
+            'score': score
+        }), 201
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@bp.route('/api/calls/search', methods=['GET'])
+def search_calls():
+    """
+    Busca textual ranqueada em transcrições e relatórios
+    O índice FTS cobre só o banco principal: meses arquivados (ver retention.py)
+    ficam fora da busca. A resposta traz archived_until e archive_skipped
+    (o período pedido alcança meses arquivados); um período date_to
+    inteiramente arquivado é recusado com 400
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({
+                'success': False,
+                'error': 'Parâmetro q é obrigatório'
+            }), 400
+        
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        date_from = request.args.get('date_from')
+        date_to = request.args.get('date_to')
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        archived = retention.archived_until(cursor)
+        if archived and date_to and date_to[:7] <= archived:
+            conn.close()
+            return jsonify({
+                'success': False,
+                'error': f'A busca textual não cobre meses arquivados (até {archived})',
+                'archived_until': archived
+            }), 400
+        
+        results = call_search.search_calls(cursor, query, request.args,
+                                           limit=limit, offset=offset)
+        conn.close()
+        
+        return jsonify({
+            'success': True,
+            'query': query,
+            'calls': results,
+            'total': len(results),
+            'archived_until': archived,
+            'archive_skipped': bool(archived and (not date_from or date_from[:7] <= archived))
+        })
+    except sqlite3.OperationalError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Busca inválida: {e}'
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@bp.route('/api/calls/monthly', methods=['GET'])
+def get_monthly_calls():
+    """Totais mensais de todo o histórico, incluindo os meses arquivados"""
+    try:
+        operator_id = request.args.get('operator_id', type=int)
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        months = retention.monthly_summary(cursor, operator_id)
+        conn.close()
+        
+        return jsonify({
+            'success': True,
+            'months': months,
+            'total': len(months)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ==================== ROTAS DE OPERADORES ====================
+
+@bp.route('/api/operators/leaderboard', methods=['GET'])
+def get_leaderboard():
+    """Ranking de operadores pela nota móvel (top-k ou bottom-k)"""
+    try:
+        k = min(max(request.args.get('k', 10, type=int), 1), 100)
+        bottom = request.args.get('order', 'top') == 'bottom'
+        shift = request.args.get('shift')
+        min_calls = max(request.args.get('min_calls', 1, type=int), 1)
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        ranking = operator_stats.leaderboard(cursor, k=k, bottom=bottom,
+                                             shift=shift, min_calls=min_calls)
+        conn.close()
+        
+        return jsonify({
+            'success': True,
+            'order': 'bottom' if bottom else 'top',
+            'shift': shift,
+            'operators': ranking,
+            'total': len(ranking)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 # ==================== WEBSOCKET EVENTS ====================
 
 @socketio.on('connect')
@@ -373,7 +709,7 @@ def handle_join_room(data):
 # ==================== INTEGRAÇÃO COM AUDIO.PY ====================
 
 # Registra as rotas do audio.py no app principal
-@app.route('/upload', methods=['POST'])
+@bp.route('/upload', methods=['POST'])
 def upload_audio():
     """Endpoint para upload de áudio - integração futura com audio.py"""
     try:
@@ -406,38 +742,56 @@ def upload_audio():
 
 # ==================== INICIALIZAÇÃO ====================
 
+def create_app(config=None):
+    """Cria o app do backend; `config` sobrepõe o que vem do ambiente"""
+    app = Flask(__name__)
+    app.config.update(load_config())
+    if config:
+        app.config.update(config)
+
+    CORS(app, origins=app.config['CORS_ORIGINS'])
+    app.register_blueprint(bp)
+
+    if app.config['SOCKETIO_QUEUE']:
+        # Sem sessões "sticky" entre workers, só o transporte websocket é seguro
+        socketio.init_app(app, cors_allowed_origins="*",
+                          client_manager=SQLiteManager(app.config['SOCKETIO_QUEUE']),
+                          transports=['websocket'])
+    else:
+        socketio.init_app(app, cors_allowed_origins="*")
+    return app
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Monitor.AI Backend')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Processos do servidor; acima de 1 usa gunicorn (modo produção)')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+    
     print("=== Iniciando Monitor.AI Backend ===")
     
-    # Inicializa o banco de dados
-    init_database()
-    print("✓ Banco de dados inicializado")
+    if args.workers > 1:
+        # Modo produção: gunicorn com N workers e eventos distribuídos pela fila local;
+        # o banco é preparado pelo hook on_starting do gunicorn.conf.py
+        print(f"✓ Modo produção com {args.workers} workers na porta {args.port}")
+        os.execvp(sys.executable, [
+            sys.executable, '-m', 'gunicorn',
+            '-c', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py'),
+            '--workers', str(args.workers),
+            '--bind', f'0.0.0.0:{args.port}',
+            'main:create_app()'
+        ])
     
-    # Cria usuário admin padrão se não existir
-    try:
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute('SELECT id FROM users WHERE username = ?', ('admin',))
-        if not cursor.fetchone():
-            password_hash = generate_password_hash('admin123')
-            cursor.execute('''
-                INSERT INTO users (username, email, password_hash, role, active)
-                VALUES (?, ?, ?, ?, ?)
-            ''', ('admin', 'admin@monitor.ai', password_hash, 'admin', True))
-            conn.commit()
-            print("✓ Usuário admin criado (admin/admin123)")
-        conn.close()
-    except Exception as e:
-        print(f"Erro ao criar usuário admin: {e}")
+    setup_database()
     
-    print("✓ Servidor iniciando na porta 5000")
+    print(f"✓ Servidor iniciando na porta {args.port}")
     print("✓ Frontend esperado em http://localhost:3000")
     print("✓ WebSocket habilitado")
     print("=" * 40)
     
     # Inicia o servidor
-    socketio.run(app, 
+    socketio.run(create_app(), 
                 host='0.0.0.0', 
-                port=5000, 
+                port=args.port, 
                 debug=True,
                 allow_unsafe_werkzeug=True)
\ No newline at end of file
@@ -0,0 +1,479 @@
+"""
+Metrics_engine.py - Métricas customizadas do dashboard do Monitor.AI
+Compila uma definição declarativa (JSON) em uma única consulta SQL
+parametrizada sobre calls/operators, com cache do plano por definição
+
+Se o período dos filtros (created_at/day) alcança meses arquivados (ver
+retention.py), cada partição devolve agregados parciais que são somados aos do
+banco principal; percentis não se combinam entre partes e, nesse caso, a
+definição é recusada. O drill-down também soma as partições do período.
+
+Exemplo de definição:
+{
+    "metrics": [
+        {"name": "total", "agg": "count"},
+        {"name": "conformidade", "agg": "ratio", "where": [{"field": "conformity", "op": "=", "value": true}]},
+        {"name": "tempo_medio", "agg": "avg", "field": "duration"},
+        {"name": "p90_tempo", "agg": "percentile", "field": "duration", "p": 90}
+    ],
+    "filters": [{"field": "shift", "op": "in", "value": ["morning", "afternoon"]}],
+    "group_by": ["operator", "hour"],
+    "order_by": "conformidade",
+    "desc": true,
+    "limit": 50
+}
+"""
+
+import json
+import re
+import sqlite3
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from retention import call_sources, partitions
+
+# Colunas numéricas que podem ser agregadas
+FIELDS = {
+    'duration': 'c.duration',
+    'score': 'c.score',
+    'conformity': 'c.conformity',
+    'alert_pending': 'c.alert_pending',
+}
+
+# Dimensões de agrupamento (também valem como campos de filtro)
+DIMENSIONS = {
+    'operator': 'c.operator_id',
+    'shift': 'o.shift',
+    'hour': "CAST(strftime('%H', c.created_at) AS INTEGER)",
+    'day': 'date(c.created_at)',
+    'weekday': "CAST(strftime('%w', c.created_at) AS INTEGER)",
+}
+
+FILTER_FIELDS = {**FIELDS, **DIMENSIONS, 'created_at': 'c.created_at'}
+
+# Filtros que limitam o período (escolhem as partições arquivadas consultadas)
+DATE_FIELDS = ('created_at', 'day')
+
+COMPARISONS = {'=': '=', '!=': '!=', '>': '>', '>=': '>=', '<': '<', '<=': '<='}
+LIST_OPERATORS = {'in': 'IN', 'not_in': 'NOT IN'}
+AGGREGATES = ('count', 'sum', 'avg', 'min', 'max', 'ratio', 'percentile')
+
+MAX_METRICS = 20
+MAX_LIMIT = 10000
+PLAN_CACHE_SIZE = 256
+
+_NAME_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]{0,63}$')
+
+# Turno vem da tabela operators (um por usuário, mesmo com linhas repetidas)
+def _from(table: str = 'calls') -> str:
+    return f'''
+    FROM {table} c
+    LEFT JOIN (
+        SELECT user_id, MIN(shift) AS shift FROM main.operators GROUP BY user_id
+    ) o ON o.user_id = c.operator_id
+'''
+
+
+class MetricDefinitionError(ValueError):
+    """Definição de métrica inválida"""
+
+
+@dataclass(frozen=True)
+class CompiledMetrics:
+    sql: str
+    params: Tuple[Any, ...]
+    dimensions: Tuple[str, ...]
+    metrics: Tuple[str, ...]
+    # Agregados parciais por fonte ({source} = tabela) e a consulta que os soma
+    partial_sql: str
+    merge_sql: str
+    has_percentile: bool
+    date_from: Optional[str]
+    date_to: Optional[str]
+
+
+def _scalar(value: Any) -> Any:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float, str)):
+        return value
+    raise MetricDefinitionError(f'Valor de filtro inválido: {value!r}')
+
+
+def _compile_conditions(conditions: Any, params: List[Any]) -> List[str]:
+    """Converte [{field, op, value}, ...] em cláusulas SQL com parâmetros"""
+    if conditions is None:
+        return []
+    if not isinstance(conditions, list):
+        raise MetricDefinitionError('Filtros devem ser uma lista')
+
+    clauses = []
+    for condition in conditions:
+        if not isinstance(condition, dict):
+            raise MetricDefinitionError('Cada filtro deve ser um objeto')
+        field = condition.get('field')
+        op = condition.get('op', '=')
+        value = condition.get('value')
+        if not isinstance(field, str) or field not in FILTER_FIELDS:
+            raise MetricDefinitionError(f'Campo de filtro desconhecido: {field}')
+        if not isinstance(op, str):
+            raise MetricDefinitionError(f'Operador desconhecido: {op}')
+        column = FILTER_FIELDS[field]
+
+        if op in COMPARISONS:
+            if value is None:
+                if op not in ('=', '!='):
+                    raise MetricDefinitionError(f'Operador {op} não aceita valor nulo')
+                clauses.append(f"{column} IS {'NOT ' if op == '!=' else ''}NULL")
+                continue
+            clauses.append(f'{column} {COMPARISONS[op]} ?')
+            params.append(_scalar(value))
+        elif op in LIST_OPERATORS:
+            if not isinstance(value, list) or not value:
+                raise MetricDefinitionError(f'Operador {op} exige uma lista não vazia')
+            clauses.append(f"{column} {LIST_OPERATORS[op]} ({', '.join('?' * len(value))})")
+            params.extend(_scalar(item) for item in value)
+        elif op == 'between':
+            if not isinstance(value, list) or len(value) != 2:
+                raise MetricDefinitionError('Operador between exige [início, fim]')
+            clauses.append(f'{column} BETWEEN ? AND ?')
+            params.extend(_scalar(item) for item in value)
+        else:
+            raise MetricDefinitionError(f'Operador desconhecido: {op}')
+    return clauses
+
+
+def _date_range(conditions: List[Dict[str, Any]]) -> Tuple[Optional[str], Optional[str]]:
+    """Período (início, fim) coberto pelos filtros de data; None = sem limite"""
+    lower, upper = [], []
+    for condition in conditions or []:
+        if condition.get('field') not in DATE_FIELDS:
+            continue
+        op, value = condition.get('op', '='), condition.get('value')
+        values = value if isinstance(value, list) else [value]
+        if not values or not all(isinstance(item, str) for item in values):
+            continue
+        if op in ('=', 'in', 'between'):
+            lower.append(min(values))
+            upper.append(max(values))
+        elif op in ('>', '>='):
+            lower.append(value)
+        elif op in ('<', '<='):
+            upper.append(value)
+    return max(lower) if lower else None, min(upper) if upper else None
+
+
+def _compile(definition: Dict[str, Any]) -> CompiledMetrics:
+    if not isinstance(definition, dict):
+        raise MetricDefinitionError('A definição deve ser um objeto JSON')
+
+    metrics = definition.get('metrics')
+    if not isinstance(metrics, list) or not metrics:
+        raise MetricDefinitionError('Informe ao menos uma métrica em "metrics"')
+    if len(metrics) > MAX_METRICS:
+        raise MetricDefinitionError(f'Máximo de {MAX_METRICS} métricas por consulta')
+
+    group_by = definition.get('group_by') or []
+    if not isinstance(group_by, list) or not all(isinstance(d, str) for d in group_by):
+        raise MetricDefinitionError('group_by deve ser uma lista de dimensões')
+    if len(set(group_by)) != len(group_by):
+        raise MetricDefinitionError('group_by deve ser uma lista sem repetições')
+    for dimension in group_by:
+        if dimension not in DIMENSIONS:
+            raise MetricDefinitionError(f'Dimensão desconhecida: {dimension}')
+
+    # Parâmetros na ordem em que aparecem no SQL: base (métricas, filtros), depois limit
+    base_params: List[Any] = []
+    base_columns = [f'{DIMENSIONS[d]} AS d{i}' for i, d in enumerate(group_by)]
+    partition = f"PARTITION BY {', '.join(f'd{i}' for i in range(len(group_by)))}" if group_by else ''
+    window_columns = []
+    outer_columns = [f'd{i}' for i in range(len(group_by))]
+    # Versão por fonte: parciais somáveis (p{i}/q{i}) e, na soma, a métrica final
+    partial_columns = [f'd{i}' for i in range(len(group_by))] + ['COUNT(*) AS n']
+    merge_columns = [f'd{i}' for i in range(len(group_by))]
+    has_percentile = False
+    names = []
+
+    for i, metric in enumerate(metrics):
+        if not isinstance(metric, dict):
+            raise MetricDefinitionError('Cada métrica deve ser um objeto')
+        name = metric.get('name')
+        agg = metric.get('agg')
+        field = metric.get('field')
+        if not isinstance(name, str) or not _NAME_PATTERN.match(name):
+            raise MetricDefinitionError(f'Nome de métrica inválido: {name!r}')
+        if name in names or name in group_by:
+            raise MetricDefinitionError(f'Nome de métrica repetido: {name}')
+        if not isinstance(agg, str) or agg not in AGGREGATES:
+            raise MetricDefinitionError(f'Agregação desconhecida em {name}: {agg}')
+        if field is not None and (not isinstance(field, str) or field not in FIELDS):
+            raise MetricDefinitionError(f'Campo desconhecido em {name}: {field}')
+        if agg in ('sum', 'avg', 'min', 'max', 'percentile') and field is None:
+            raise MetricDefinitionError(f'A agregação {agg} em {name} exige "field"')
+        names.append(name)
+
+        # Valor da métrica por chamada: campo (ou 1) quando a condição da métrica vale
+        conditions = _compile_conditions(metric.get('where'), base_params)
+        value = FIELDS[field] if field else '1'
+        if conditions:
+            value = f"CASE WHEN {' AND '.join(conditions)} THEN {value} END"
+        base_columns.append(f'{value} AS v{i}')
+
+        if agg == 'count':
+            outer_columns.append(f'COUNT(v{i})')
+            partial_columns.append(f'COUNT(v{i}) AS p{i}')
+            merge_columns.append(f'SUM(p{i})')
+        elif agg == 'ratio':
+            # Percentual das chamadas do grupo que atendem a condição (ou média do campo)
+            outer_columns.append(f'ROUND(100.0 * COALESCE(SUM(v{i}), 0) / COUNT(*), 2)')
+            partial_columns.append(f'SUM(v{i}) AS p{i}')
+            merge_columns.append(f'ROUND(100.0 * COALESCE(SUM(p{i}), 0) / SUM(n), 2)')
+        elif agg == 'avg':
+            outer_columns.append(f'ROUND(AVG(v{i}), 4)')
+            partial_columns.extend([f'SUM(v{i}) AS p{i}', f'COUNT(v{i}) AS q{i}'])
+            merge_columns.append(f'ROUND(CAST(SUM(p{i}) AS REAL) / SUM(q{i}), 4)')
+        elif agg == 'percentile':
+            has_percentile = True
+            p = metric.get('p')
+            if isinstance(p, bool) or not isinstance(p, (int, float)) or not 0 < p <= 100:
+                raise MetricDefinitionError(f'Percentil de {name} deve estar entre 0 e 100')
+            # Nearest-rank: posição ceil(p/100 * n) entre os valores não nulos do grupo
+            window_columns.append(
+                f'ROW_NUMBER() OVER ({partition} ORDER BY v{i} IS NULL, v{i}) AS r{i}'
+            )
+            window_columns.append(f'COUNT(v{i}) OVER ({partition}) AS n{i}')
+            rank = f'({p} / 100.0 * n{i})'
+            target = f'MAX(1, CAST({rank} AS INTEGER) + ({rank} > CAST({rank} AS INTEGER)))'
+            outer_columns.append(f'MAX(CASE WHEN r{i} = {target} THEN v{i} END)')
+        else:
+            outer_columns.append(f'{agg.upper()}(v{i})')
+            partial_columns.append(f'{agg.upper()}(v{i}) AS p{i}')
+            merge_columns.append(f'{agg.upper()}(p{i})')
+
+    where = _compile_conditions(definition.get('filters'), base_params)
+    date_from, date_to = _date_range(definition.get('filters'))
+
+    order_by = definition.get('order_by')
+    if order_by is not None and not isinstance(order_by, str):
+        raise MetricDefinitionError(f'order_by desconhecido: {order_by}')
+    if order_by is None:
+        order_sql = ', '.join(f'd{i}' for i in range(len(group_by)))
+    elif order_by in names:
+        order_sql = f'{len(group_by) + names.index(order_by) + 1}'
+    elif order_by in group_by:
+        order_sql = f'd{group_by.index(order_by)}'
+    else:
+        raise MetricDefinitionError(f'order_by desconhecido: {order_by}')
+    if order_sql and definition.get('desc'):
+        order_sql += ' DESC'
+
+    limit = definition.get('limit', 1000)
+    if isinstance(limit, bool) or not isinstance(limit, int) or not 0 < limit <= MAX_LIMIT:
+        raise MetricDefinitionError(f'limit deve estar entre 1 e {MAX_LIMIT}')
+
+    def base(table):
+        return f'''
+        WITH base AS (
+            SELECT {', '.join(base_columns)}
+            {_from(table)}
+            {'WHERE ' + ' AND '.join(where) if where else ''}
+        )'''
+
+    group_sql = 'GROUP BY ' + ', '.join(f'd{i}' for i in range(len(group_by))) if group_by else ''
+    sql = f'''{base('calls')}
+        SELECT {', '.join(outer_columns)}
+        FROM {'(SELECT *, ' + ', '.join(window_columns) + ' FROM base)' if window_columns else 'base'}
+        {group_sql}
+        {'ORDER BY ' + order_sql if order_sql else ''}
+        LIMIT ?
+    '''
+    partial_sql = f'''{base('{source}')}
+        SELECT {', '.join(partial_columns)}
+        FROM base
+        {group_sql}
+    '''
+    # Linhas parciais de todas as fontes chegam como um array JSON
+    aliases = [column.rsplit(' AS ', 1)[-1] for column in partial_columns]
+    merge_sql = f'''
+        WITH parts AS (
+            SELECT {', '.join(f"json_extract(value, '$[{j}]') AS {alias}" for j, alias in enumerate(aliases))}
+            FROM json_each(?)
+        )
+        SELECT {', '.join(merge_columns)}
+        FROM parts
+        {group_sql}
+        {'ORDER BY ' + order_sql if order_sql else ''}
+        LIMIT ?
+    '''
+    return CompiledMetrics(
+        sql=sql,
+        params=tuple(base_params) + (limit,),
+        dimensions=tuple(group_by),
+        metrics=tuple(names),
+        partial_sql=partial_sql,
+        merge_sql=merge_sql,
+        has_percentile=has_percentile,
+        date_from=date_from,
+        date_to=date_to
+    )
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _compile_cached(canonical: str) -> CompiledMetrics:
+    return _compile(json.loads(canonical))
+
+
+def compile_definition(definition: Dict[str, Any]) -> CompiledMetrics:
+    """Compila (ou busca no cache) a consulta de uma definição"""
+    try:
+        canonical = json.dumps(definition, sort_keys=True, separators=(',', ':'))
+    except (TypeError, ValueError):
+        raise MetricDefinitionError('Definição não serializável em JSON')
+    return _compile_cached(canonical)
+
+
+def run_metrics(conn: sqlite3.Connection, definition: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Executa a definição no banco e devolve as linhas já nomeadas
+    Sem partições arquivadas no período dos filtros, é uma consulta só; com
+    elas, cada fonte devolve agregados parciais que uma segunda consulta soma
+    """
+    compiled = compile_definition(definition)
+    columns = compiled.dimensions + compiled.metrics
+    archived = partitions(conn.cursor(), compiled.date_from, compiled.date_to)
+    if not archived:
+        rows = conn.execute(compiled.sql, compiled.params).fetchall()
+    elif compiled.has_percentile:
+        raise MetricDefinitionError(
+            f"Percentis não cobrem meses arquivados (até {archived[0]['month']}): "
+            'filtre created_at a partir do mês seguinte'
+        )
+    else:
+        parts = []
+        with closing(call_sources(conn, compiled.date_from, compiled.date_to)) as sources:
+            for table in sources:
+                parts.extend(conn.execute(compiled.partial_sql.replace('{source}', table),
+                                          compiled.params[:-1]).fetchall())
+        rows = conn.execute(compiled.merge_sql, (json.dumps(parts), compiled.params[-1])).fetchall()
+    return {
+        'dimensions': list(compiled.dimensions),
+        'metrics': list(compiled.metrics),
+        'rows': [dict(zip(columns, row)) for row in rows],
+        'calculated_at': datetime.now().isoformat()
+    }
+
+
+# ==================== DRILL-DOWN (CUBO) ====================
+
+DRILLDOWN_DIMENSIONS = ('operator', 'shift', 'day', 'hour', 'weekday')
+MAX_DRILLDOWN_DIMENSIONS = 4
+
+
+def _cube_row(key: Tuple, dims: Tuple[str, ...], acc: List[float]) -> Dict[str, Any]:
+    calls, conforming, alerts, duration_total, duration_count = acc
+    row = dict(zip(dims, key))
+    row.update({
+        'totalCalls': int(calls),
+        'conformityRate': round(conforming * 100 / calls, 1) if calls else 0.0,
+        'pendingAlerts': int(alerts),
+        'avgTime': round(duration_total / duration_count / 60, 1) if duration_count else 0.0,
+    })
+    return row
+
+
+def _sort_key(row_key: Tuple) -> Tuple:
+    return tuple((value is None, value) for value in row_key)
+
+
+def drilldown(conn: sqlite3.Connection, dimensions: List[str],
+              where: List[str] = None, params: List[Any] = None,
+              date_from: Optional[str] = None, date_to: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Cubo de totais, conformidade, alertas e tempo médio pelas dimensões pedidas
+
+    Uma consulta por fonte (banco principal e cada partição arquivada do
+    período date_from/date_to) agrupa as chamadas no nível mais detalhado; os
+    grupos das fontes são somados e os subtotais de todas as combinações de
+    dimensões (e o total geral) são derivados deles, então o custo depois das
+    consultas depende só do número de grupos.
+    where/params usam o alias c para calls (ver call_search.call_filters).
+    """
+    if len(set(dimensions)) != len(dimensions):
+        raise MetricDefinitionError('Dimensões repetidas')
+    if len(dimensions) > MAX_DRILLDOWN_DIMENSIONS:
+        raise MetricDefinitionError(f'Máximo de {MAX_DRILLDOWN_DIMENSIONS} dimensões')
+    for dimension in dimensions:
+        if dimension not in DRILLDOWN_DIMENSIONS:
+            raise MetricDefinitionError(f'Dimensão desconhecida: {dimension}')
+
+    where = where or []
+    select = [f'{DIMENSIONS[d]} AS d{i}' for i, d in enumerate(dimensions)]
+    group = ', '.join(f'd{i}' for i in range(len(dimensions)))
+    n = len(dimensions)
+    columns = ', '.join(select + [
+        'COUNT(*)',
+        'COALESCE(SUM(c.conformity), 0)',
+        'COALESCE(SUM(c.alert_pending), 0)',
+        'COALESCE(SUM(c.duration), 0)',
+        'COUNT(NULLIF(c.duration, 0))'
+    ])
+
+    # Grupos no nível mais detalhado, somados entre as fontes
+    grouped: Dict[Tuple, List[float]] = {}
+    with closing(call_sources(conn, date_from, date_to)) as sources:
+        for table in sources:
+            rows = conn.execute(f'''
+                SELECT {columns}
+                {_from(table)}
+                {'WHERE ' + ' AND '.join(where) if where else ''}
+                {'GROUP BY ' + group if group else ''}
+            ''', params or []).fetchall()
+            for row in rows:
+                key, values = tuple(row[:n]), row[n:]
+                if not values[0]:
+                    continue
+                acc = grouped.get(key)
+                if acc is None:
+                    grouped[key] = list(values)
+                else:
+                    for j, value in enumerate(values):
+                        acc[j] += value
+
+    dims = tuple(dimensions)
+    # Cada subconjunto de dimensões (máscara de bits) acumula seus subtotais
+    cube: Dict[int, Dict[Tuple, List[float]]] = {mask: {} for mask in range(1 << n)}
+    for key, values in grouped.items():
+        for mask, groups in cube.items():
+            sub_key = tuple(key[i] for i in range(n) if mask >> i & 1)
+            acc = groups.get(sub_key)
+            if acc is None:
+                groups[sub_key] = list(values)
+            else:
+                for j, value in enumerate(values):
+                    acc[j] += value
+
+    full = (1 << n) - 1
+    subtotals = []
+    for mask in sorted(cube, key=lambda m: (-bin(m).count('1'), m)):
+        # Grupos completos e total geral já saem em 'groups' e 'total'
+        if mask in (full, 0):
+            continue
+        by = tuple(dims[i] for i in range(n) if mask >> i & 1)
+        subtotals.append({
+            'by': list(by),
+            'rows': [_cube_row(key, by, acc)
+                     for key, acc in sorted(cube[mask].items(), key=lambda item: _sort_key(item[0]))]
+        })
+
+    total = cube[0].get((), [0, 0, 0, 0, 0])
+    return {
+        'dimensions': list(dims),
+        'groups': [_cube_row(key, dims, acc)
+                   for key, acc in sorted(cube[full].items(), key=lambda item: _sort_key(item[0]))],
+        'subtotals': subtotals,
+        'total': _cube_row((), (), total),
+        'calculated_at': datetime.now().isoformat()
+    }
@@ -0,0 +1,171 @@
+"""
+Operator_stats.py - Estatísticas acumuladas por operador para o Monitor.AI
+Mantém contadores e nota móvel (EWMA) atualizados a cada chamada registrada,
+sem precisar varrer a tabela de chamadas para montar rankings
+"""
+
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+# Peso da nota mais recente na média móvel exponencial
+SCORE_ALPHA = float(os.environ.get('OPERATOR_SCORE_ALPHA', 0.1))
+
+# "Nota final (média geral): 7,5" / "**Nota final:** 8"
+_GRADE_PATTERN = re.compile(r'nota\s+final[^0-9\n]{0,40}(\d{1,2}(?:[.,]\d+)?)', re.IGNORECASE)
+
+
+def create_tables(cursor):
+    """Cria a tabela de estatísticas e os índices usados pelo ranking"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS operator_stats (
+            operator_id INTEGER PRIMARY KEY,
+            shift TEXT,
+            calls_count INTEGER NOT NULL DEFAULT 0,
+            conformity_count INTEGER NOT NULL DEFAULT 0,
+            duration_total INTEGER NOT NULL DEFAULT 0,
+            scored_count INTEGER NOT NULL DEFAULT 0,
+            score REAL,
+            last_call_at TIMESTAMP,
+            FOREIGN KEY (operator_id) REFERENCES users (id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_operator_stats_score ON operator_stats (score)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_operator_stats_shift_score ON operator_stats (shift, score)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_operators_user ON operators (user_id)')
+
+
+def rebuild(cursor):
+    """
+    Recalcula as estatísticas a partir da tabela calls e dos agregados das
+    chamadas arquivadas (calls_rollup, ver retention.py)
+    Usado só na criação da tabela; a nota inicial é a média simples das notas
+    """
+    cursor.execute('DELETE FROM operator_stats')
+    cursor.execute('''
+        INSERT INTO operator_stats (operator_id, shift, calls_count, conformity_count,
+                                    duration_total, scored_count, score, last_call_at)
+        SELECT c.operator_id,
+               (SELECT o.shift FROM operators o WHERE o.user_id = c.operator_id LIMIT 1),
+               SUM(c.calls_count),
+               SUM(c.conformity_count),
+               SUM(c.duration_total),
+               SUM(c.scored_count),
+               SUM(c.score_total) / NULLIF(SUM(c.scored_count), 0),
+               MAX(c.last_call_at)
+        FROM (
+            SELECT operator_id, COUNT(*) AS calls_count,
+                   COALESCE(SUM(conformity), 0) AS conformity_count,
+                   COALESCE(SUM(duration), 0) AS duration_total,
+                   COUNT(score) AS scored_count, COALESCE(SUM(score), 0) AS score_total,
+                   MAX(created_at) AS last_call_at
+            FROM calls
+            WHERE operator_id IS NOT NULL
+            GROUP BY operator_id
+            UNION ALL
+            SELECT operator_id, calls_count, conformity_count, duration_total,
+                   scored_count, score_total, last_call_at
+            FROM calls_rollup
+            WHERE operator_id != 0
+        ) c
+        GROUP BY c.operator_id
+    ''')
+    cursor.execute('''
+        UPDATE operators SET performance_score = COALESCE(
+            (SELECT s.score FROM operator_stats s WHERE s.operator_id = operators.user_id),
+            performance_score
+        )
+    ''')
+
+
+def extract_grade(analysis_result: Optional[str]) -> Optional[float]:
+    """Lê a nota final (0 a 10) do relatório gerado pela IA"""
+    if not analysis_result:
+        return None
+    match = _GRADE_PATTERN.search(analysis_result)
+    if not match:
+        return None
+    grade = float(match.group(1).replace(',', '.'))
+    return grade if 0 <= grade <= 10 else None
+
+
+def record_call(cursor, operator_id: int, duration: Optional[int], conformity: bool,
+                score: Optional[float], created_at: Optional[str] = None):
+    """Soma uma chamada às estatísticas do operador em O(1)"""
+    cursor.execute('SELECT shift FROM operators WHERE user_id = ? LIMIT 1', (operator_id,))
+    row = cursor.fetchone()
+    shift = row[0] if row else None
+
+    cursor.execute('''
+        INSERT INTO operator_stats (operator_id, shift, calls_count, conformity_count,
+                                    duration_total, scored_count, score, last_call_at)
+        VALUES (?, ?, 1, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+        ON CONFLICT (operator_id) DO UPDATE SET
+            shift = COALESCE(excluded.shift, shift),
+            calls_count = calls_count + 1,
+            conformity_count = conformity_count + excluded.conformity_count,
+            duration_total = duration_total + excluded.duration_total,
+            scored_count = scored_count + excluded.scored_count,
+            score = CASE
+                WHEN excluded.score IS NULL THEN score
+                WHEN score IS NULL THEN excluded.score
+                ELSE score + ? * (excluded.score - score)
+            END,
+            last_call_at = MAX(COALESCE(last_call_at, ''), excluded.last_call_at)
+    ''', (
+        operator_id,
+        shift,
+        1 if conformity else 0,
+        duration or 0,
+        0 if score is None else 1,
+        score,
+        created_at,
+        SCORE_ALPHA
+    ))
+
+    if score is not None:
+        cursor.execute('''
+            UPDATE operators SET performance_score = (
+                SELECT score FROM operator_stats WHERE operator_id = ?
+            ) WHERE user_id = ?
+        ''', (operator_id, operator_id))
+
+
+def _row_to_dict(row) -> Dict[str, Any]:
+    calls_count = row[2] or 0
+    return {
+        'operator_id': row[0],
+        'operator_name': row[8],
+        'shift': row[1],
+        'calls': calls_count,
+        'conformity_rate': round(row[3] * 100 / calls_count, 1) if calls_count else 0.0,
+        'avg_duration': round(row[4] / calls_count, 1) if calls_count else 0.0,
+        'scored_calls': row[5],
+        'score': round(row[6], 2) if row[6] is not None else None,
+        'last_call_at': row[7]
+    }
+
+
+def leaderboard(cursor, k: int = 10, bottom: bool = False,
+                shift: Optional[str] = None, min_calls: int = 1) -> List[Dict[str, Any]]:
+    """
+    Top-k (ou bottom-k) operadores pela nota móvel
+    A ordenação percorre o índice de score, sem varrer chamadas
+    """
+    where = ['s.score IS NOT NULL', 's.calls_count >= ?']
+    params: List[Any] = [min_calls]
+    if shift:
+        where.append('s.shift = ?')
+        params.append(shift)
+    params.append(k)
+
+    cursor.execute(f'''
+        SELECT s.operator_id, s.shift, s.calls_count, s.conformity_count, s.duration_total,
+               s.scored_count, s.score, s.last_call_at, u.username
+        FROM operator_stats s
+        LEFT JOIN users u ON u.id = s.operator_id
+        WHERE {' AND '.join(where)}
+        ORDER BY s.score {'ASC' if bottom else 'DESC'}
+        LIMIT ?
+    ''', params)
+    return [_row_to_dict(row) for row in cursor.fetchall()]
@@ -0,0 +1,429 @@
+"""
+Retention.py - Retenção em camadas das chamadas do Monitor.AI
+Mantém os meses recentes no banco principal e move os antigos para arquivos
+SQLite mensais com transcrição e relatório comprimidos (zlib), guardando os
+agregados mensais por operador no banco principal
+
+Uso:
+    python retention.py archive --hot-months 6 --compact
+    python retention.py compact
+    python retention.py status
+"""
+
+import argparse
+import os
+import sqlite3
+import zlib
+from contextlib import closing
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+HOT_MONTHS = int(os.environ.get('RETENTION_HOT_MONTHS', 6))
+ARCHIVE_DIR = os.environ.get('MONITOR_ARCHIVE_DIR')
+COMPRESSION_LEVEL = 6
+
+# Colunas de calls, na ordem das partições; as de texto longo vão comprimidas
+CALL_COLUMNS = ('id', 'operator_id', 'duration', 'conformity', 'alert_pending', 'audio_file',
+                'analysis_result', 'created_at', 'score', 'transcript')
+COMPRESSED_COLUMNS = ('analysis_result', 'transcript')
+
+
+def create_tables(cursor):
+    """Agregados mensais das chamadas arquivadas e registro das partições"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS calls_rollup (
+            month TEXT NOT NULL,
+            operator_id INTEGER NOT NULL,
+            calls_count INTEGER NOT NULL DEFAULT 0,
+            conformity_count INTEGER NOT NULL DEFAULT 0,
+            alert_count INTEGER NOT NULL DEFAULT 0,
+            duration_total INTEGER NOT NULL DEFAULT 0,
+            duration_count INTEGER NOT NULL DEFAULT 0,
+            scored_count INTEGER NOT NULL DEFAULT 0,
+            score_total REAL NOT NULL DEFAULT 0,
+            last_call_at TIMESTAMP,
+            PRIMARY KEY (month, operator_id)
+        )
+    ''')
+    # Chamadas com duração (> 0), base do tempo médio do dashboard
+    cursor.execute('PRAGMA table_info(calls_rollup)')
+    if 'duration_count' not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute('ALTER TABLE calls_rollup ADD COLUMN duration_count INTEGER NOT NULL DEFAULT 0')
+        # Agregados anteriores à coluna: aproxima por todas as chamadas do grupo
+        cursor.execute('UPDATE calls_rollup SET duration_count = calls_count WHERE duration_total > 0')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archive_partitions (
+            month TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            calls_count INTEGER NOT NULL DEFAULT 0,
+            raw_bytes INTEGER NOT NULL DEFAULT 0,
+            stored_bytes INTEGER NOT NULL DEFAULT 0,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+# --- compressão ---
+def _compress(value):
+    if value is None or isinstance(value, bytes):
+        return value
+    return zlib.compress(str(value).encode('utf-8'), COMPRESSION_LEVEL)
+
+
+def _decompress(value):
+    """Textos das partições voltam descomprimidos; os do banco principal passam direto"""
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+
+def register_functions(conn):
+    conn.create_function('zcompress', 1, _compress, deterministic=True)
+    conn.create_function('zdecompress', 1, _decompress, deterministic=True)
+
+
+# --- partições ---
+def archive_dir(database: str) -> str:
+    """Pasta das partições: MONITOR_ARCHIVE_DIR ou archive/ ao lado do banco"""
+    return ARCHIVE_DIR or os.path.join(os.path.dirname(os.path.abspath(database)), 'archive')
+
+
+def _database_path(conn) -> str:
+    return next(row[2] for row in conn.execute('PRAGMA database_list') if row[1] == 'main')
+
+
+def _month_bounds(month: str):
+    year, number = int(month[:4]), int(month[5:7])
+    following = f'{year + number // 12:04d}-{number % 12 + 1:02d}'
+    return f'{month}-01', f'{following}-01'
+
+
+def hot_cutoff(hot_months: int = HOT_MONTHS, today: Optional[date] = None) -> str:
+    """Primeiro mês que continua no banco principal (o atual conta como um)"""
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - (max(hot_months, 1) - 1)
+    return f'{index // 12:04d}-{index % 12 + 1:02d}'
+
+
+def partitions(cursor, date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Partições registradas que cruzam o período, da mais recente para a mais antiga"""
+    where, params = [], []
+    if date_from:
+        where.append('month >= ?')
+        params.append(date_from[:7])
+    if date_to:
+        where.append('month <= ?')
+        params.append(date_to[:7])
+    cursor.execute(f'''
+        SELECT month, filename, calls_count, raw_bytes, stored_bytes, archived_at
+        FROM archive_partitions
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY month DESC
+    ''', params)
+    return [{
+        'month': row[0],
+        'filename': row[1],
+        'calls': row[2],
+        'raw_bytes': row[3],
+        'stored_bytes': row[4],
+        'archived_at': row[5]
+    } for row in cursor.fetchall()]
+
+
+def archived_until(cursor) -> Optional[str]:
+    """Último mês arquivado (AAAA-MM), ou None se nada foi arquivado"""
+    cursor.execute('SELECT MAX(month) FROM archive_partitions')
+    return cursor.fetchone()[0]
+
+
+def call_sources(conn, date_from: Optional[str] = None, date_to: Optional[str] = None):
+    """
+    Gera a tabela de cada fonte de chamadas: calls e depois cada partição do
+    período, anexada uma por vez como `archive` (o SQLite limita os anexos)
+    Use com contextlib.closing para desanexar se o consumo parar no meio
+    """
+    yield 'main.calls'
+    directory = archive_dir(_database_path(conn))
+    for partition in partitions(conn.cursor(), date_from, date_to):
+        conn.execute('ATTACH DATABASE ? AS archive', (os.path.join(directory, partition['filename']),))
+        try:
+            yield 'archive.calls'
+        finally:
+            conn.execute('DETACH DATABASE archive')
+
+
+def list_calls(conn, where: List[str], params: List[Any], limit: int, offset: int,
+               date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[tuple]:
+    """
+    Chamadas mais recentes primeiro, no banco principal e nas partições do período
+    Filtros com alias c (ver call_search.call_filters); as partições não se
+    sobrepõem, então a busca para assim que as mais novas completam a página.
+    Se o banco principal já completa a página com chamadas mais novas que todo
+    o arquivo do período, nenhuma partição é anexada
+    """
+    register_functions(conn)
+    needed = limit + offset
+    newest = partitions(conn.cursor(), date_from, date_to)[:1]
+    archive_end = _month_bounds(newest[0]['month'])[1] if newest else None
+    rows, archived = [], 0
+    with closing(call_sources(conn, date_from, date_to)) as sources:
+        for table in sources:
+            fetched = conn.execute(f'''
+                SELECT c.id, c.operator_id, c.duration, c.conformity, c.alert_pending,
+                       c.audio_file, zdecompress(c.analysis_result), c.created_at,
+                       u.username as operator_name, c.score
+                FROM {table} c
+                LEFT JOIN main.users u ON c.operator_id = u.id
+                {'WHERE ' + ' AND '.join(where) if where else ''}
+                ORDER BY c.created_at DESC
+                LIMIT ?
+            ''', list(params) + [needed]).fetchall()
+            rows.extend(fetched)
+            if table == 'main.calls':
+                if archive_end is None or (len(fetched) >= needed and (fetched[-1][7] or '') >= archive_end):
+                    break
+            else:
+                archived += len(fetched)
+                if archived >= needed:
+                    break
+
+    rows.sort(key=lambda row: row[7] or '', reverse=True)
+    return rows[offset:needed]
+
+
+def monthly_summary(cursor, operator_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Totais por mês em todo o histórico: agregados arquivados + chamadas do banco principal"""
+    rollup_where, hot_where, params = '', 'WHERE created_at IS NOT NULL', []
+    if operator_id is not None:
+        rollup_where = 'WHERE operator_id = ?'
+        hot_where += ' AND operator_id = ?'
+        params = [operator_id, operator_id]
+
+    cursor.execute(f'''
+        SELECT month, SUM(calls_count), SUM(conformity_count), SUM(alert_count),
+               SUM(duration_total), SUM(scored_count), SUM(score_total), MAX(archived)
+        FROM (
+            SELECT month, calls_count, conformity_count, alert_count,
+                   duration_total, scored_count, score_total, 1 AS archived
+            FROM calls_rollup {rollup_where}
+            UNION ALL
+            SELECT substr(created_at, 1, 7), COUNT(*), COALESCE(SUM(conformity), 0),
+                   COALESCE(SUM(alert_pending), 0), COALESCE(SUM(duration), 0),
+                   COUNT(score), COALESCE(SUM(score), 0), 0
+            FROM calls {hot_where}
+            GROUP BY substr(created_at, 1, 7)
+        )
+        GROUP BY month
+        ORDER BY month
+    ''', params)
+    return [{
+        'month': row[0],
+        'calls': row[1],
+        'conformity_rate': round(row[2] * 100 / row[1], 1) if row[1] else 0.0,
+        'pending_alerts': row[3],
+        'avg_duration': round(row[4] / row[1], 1) if row[1] else 0.0,
+        'avg_score': round(row[6] / row[5], 2) if row[5] else None,
+        'archived': bool(row[7])
+    } for row in cursor.fetchall()]
+
+
+# --- arquivamento ---
+def _create_partition(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive.calls (
+            id INTEGER PRIMARY KEY,
+            operator_id INTEGER,
+            duration INTEGER,
+            conformity BOOLEAN,
+            alert_pending BOOLEAN,
+            audio_file TEXT,
+            analysis_result BLOB,
+            created_at TIMESTAMP,
+            score REAL,
+            transcript BLOB
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS archive.idx_calls_created_at ON calls (created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS archive.idx_calls_operator ON calls (operator_id, created_at)')
+
+
+def archive_month(conn, month: str) -> Dict[str, Any]:
+    """
+    Move as chamadas do mês (AAAA-MM) para a partição, em duas transações:
+    cópia comprimida na partição e, só depois, agregados + remoção no banco
+    principal. A segunda trava o banco (BEGIN IMMEDIATE), recopia o mês para
+    pegar chamadas gravadas no intervalo e só remove ids presentes na partição.
+    Uma falha entre as duas deixa a cópia repetida, e rodar de novo conclui o
+    mês sem duplicar nada (INSERT OR REPLACE pelo id)
+    """
+    start, end = _month_bounds(month)
+    filename = f'calls_{month}.db'
+    directory = archive_dir(_database_path(conn))
+    os.makedirs(directory, exist_ok=True)
+    register_functions(conn)
+
+    conn.execute('ATTACH DATABASE ? AS archive', (os.path.join(directory, filename),))
+    try:
+        _create_partition(conn)
+        source = ', '.join(f'zcompress({name})' if name in COMPRESSED_COLUMNS else name
+                           for name in CALL_COLUMNS)
+        copy = f'''
+            INSERT OR REPLACE INTO archive.calls ({', '.join(CALL_COLUMNS)})
+            SELECT {source} FROM main.calls
+            WHERE created_at >= ? AND created_at < ?
+        '''
+        # Só sai do banco principal o que está na partição
+        archived = 'created_at >= ? AND created_at < ? AND id IN (SELECT id FROM archive.calls)'
+
+        with conn:
+            conn.execute(copy, (start, end))
+
+        conn.execute('BEGIN IMMEDIATE')
+        with conn:
+            conn.execute(copy, (start, end))
+            moved, raw_bytes = conn.execute(f'''
+                SELECT COUNT(*), COALESCE(SUM(COALESCE(length(CAST(analysis_result AS BLOB)), 0)
+                                        + COALESCE(length(CAST(transcript AS BLOB)), 0)), 0)
+                FROM main.calls WHERE {archived}
+            ''', (start, end)).fetchone()
+
+            conn.execute(f'''
+                INSERT INTO calls_rollup (month, operator_id, calls_count, conformity_count,
+                                          alert_count, duration_total, duration_count,
+                                          scored_count, score_total, last_call_at)
+                SELECT ?, COALESCE(operator_id, 0), COUNT(*), COALESCE(SUM(conformity), 0),
+                       COALESCE(SUM(alert_pending), 0), COALESCE(SUM(duration), 0),
+                       COUNT(NULLIF(duration, 0)), COUNT(score), COALESCE(SUM(score), 0),
+                       MAX(created_at)
+                FROM main.calls
+                WHERE {archived}
+                GROUP BY COALESCE(operator_id, 0)
+                ON CONFLICT (month, operator_id) DO UPDATE SET
+                    calls_count = calls_count + excluded.calls_count,
+                    conformity_count = conformity_count + excluded.conformity_count,
+                    alert_count = alert_count + excluded.alert_count,
+                    duration_total = duration_total + excluded.duration_total,
+                    duration_count = duration_count + excluded.duration_count,
+                    scored_count = scored_count + excluded.scored_count,
+                    score_total = score_total + excluded.score_total,
+                    last_call_at = MAX(COALESCE(last_call_at, ''), excluded.last_call_at)
+            ''', (month, start, end))
+
+            # Os triggers de calls_fts tiram as chamadas do índice de busca;
+            # operator_stats é acumulado e continua valendo como está
+            conn.execute(f'DELETE FROM main.calls WHERE {archived}', (start, end))
+
+            calls_count, stored_bytes = conn.execute('''
+                SELECT COUNT(*), COALESCE(SUM(COALESCE(length(analysis_result), 0)
+                                        + COALESCE(length(transcript), 0)), 0)
+                FROM archive.calls
+            ''').fetchone()
+            conn.execute('''
+                INSERT INTO archive_partitions (month, filename, calls_count, raw_bytes, stored_bytes)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (month) DO UPDATE SET
+                    calls_count = excluded.calls_count,
+                    raw_bytes = raw_bytes + excluded.raw_bytes,
+                    stored_bytes = excluded.stored_bytes,
+                    archived_at = CURRENT_TIMESTAMP
+            ''', (month, filename, calls_count, raw_bytes, stored_bytes))
+    finally:
+        conn.execute('DETACH DATABASE archive')
+
+    return {'month': month, 'moved': moved, 'partition_calls': calls_count,
+            'raw_bytes': raw_bytes, 'stored_bytes': stored_bytes}
+
+
+def archive_old_calls(database: str, hot_months: int = HOT_MONTHS,
+                      cutoff: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Arquiva, mês a mês, todas as chamadas anteriores ao corte"""
+    cutoff = cutoff or hot_cutoff(hot_months)
+    conn = sqlite3.connect(database, timeout=30)
+    try:
+        months = [row[0] for row in conn.execute('''
+            SELECT DISTINCT substr(created_at, 1, 7) FROM calls
+            WHERE created_at < ? ORDER BY 1
+        ''', (f'{cutoff}-01',))]
+        return [archive_month(conn, month) for month in months if month]
+    finally:
+        conn.close()
+
+
+# --- compactação ---
+def file_size(path: str) -> int:
+    """Tamanho do banco somando o WAL, se houver"""
+    return sum(os.path.getsize(p) for p in (path, path + '-wal') if os.path.exists(p))
+
+
+def compact(database: str) -> Dict[str, int]:
+    """Aplica o WAL e reescreve o banco (VACUUM), devolvendo o tamanho antes e depois"""
+    before = file_size(database)
+    conn = sqlite3.connect(database, timeout=30)
+    try:
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.execute("INSERT INTO calls_fts (calls_fts) VALUES ('optimize')")
+        conn.commit()
+        conn.execute('VACUUM')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        conn.close()
+    return {'before': before, 'after': file_size(database)}
+
+
+def _mb(size: int) -> str:
+    return f'{size / 1024 / 1024:.1f} MB'
+
+
+def main():
+    from main import DATABASE, init_database
+
+    parser = argparse.ArgumentParser(description='Retenção e compactação das chamadas do Monitor.AI')
+    parser.add_argument('--db', default=DATABASE, help='Banco principal')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    archive_parser = commands.add_parser('archive', help='Move os meses antigos para partições')
+    archive_parser.add_argument('--hot-months', type=int, default=HOT_MONTHS,
+                                help='Meses mantidos no banco principal, contando o atual')
+    archive_parser.add_argument('--before', help='Arquiva os meses anteriores a AAAA-MM (em vez de --hot-months)')
+    archive_parser.add_argument('--compact', action='store_true', help='Compacta o banco ao final')
+    commands.add_parser('compact', help='VACUUM do banco principal')
+    commands.add_parser('status', help='Partições e tamanhos')
+    args = parser.parse_args()
+
+    init_database(args.db)
+
+    if args.command == 'archive':
+        before = file_size(args.db)
+        results = archive_old_calls(args.db, args.hot_months, args.before)
+        for result in results:
+            ratio = result['stored_bytes'] / result['raw_bytes'] if result['raw_bytes'] else 1.0
+            print(f"✓ {result['month']}: {result['moved']} chamadas arquivadas "
+                  f"(textos {_mb(result['raw_bytes'])} → {_mb(result['stored_bytes'])}, {ratio:.0%})")
+        if not results:
+            print("Nenhum mês a arquivar")
+        if args.compact:
+            after = compact(args.db)['after']
+            print(f"✓ Banco principal: {_mb(before)} → {_mb(after)} "
+                  f"(-{100 * (before - after) / before if before else 0:.1f}%)")
+
+    elif args.command == 'compact':
+        sizes = compact(args.db)
+        before, after = sizes['before'], sizes['after']
+        print(f"✓ Banco principal: {_mb(before)} → {_mb(after)} "
+              f"(-{100 * (before - after) / before if before else 0:.1f}%)")
+
+    else:
+        conn = sqlite3.connect(args.db)
+        found = partitions(conn.cursor())
+        directory = archive_dir(args.db)
+        hot = conn.execute('SELECT COUNT(*) FROM calls').fetchone()[0]
+        conn.close()
+        print(f"Banco principal: {hot} chamadas, {_mb(file_size(args.db))}")
+        for partition in found:
+            size = file_size(os.path.join(directory, partition['filename']))
+            print(f"  {partition['month']}: {partition['calls']} chamadas, {_mb(size)} "
+                  f"({partition['filename']})")
+
+
+if __name__ == '__main__':
+    main()
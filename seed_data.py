@@ -0,0 +1,250 @@
+"""
+Seed_data.py - Gerador determinístico de dados sintéticos para o Monitor.AI
+Popula um banco SQLite com usuários, operadores e milhões de chamadas com
+padrões realistas (picos por horário, operadores com volumes e qualidade
+diferentes) e transcrições/relatórios montados de um vocabulário pequeno,
+para testes de carga do dashboard e das buscas
+
+Uso:
+    python seed_data.py --db carga.db --operators 500 --calls 2000000 --seed 42 --end-date 2024-06-30
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from werkzeug.security import generate_password_hash
+
+import operator_stats
+from main import init_database
+
+# Senha de todos os usuários gerados (um único hash reaproveitado)
+DEFAULT_PASSWORD = 'monitor123'
+
+SHIFTS = ('morning', 'afternoon', 'night')
+SHIFT_SHARE = (0.45, 0.40, 0.15)
+
+# Peso relativo de chamadas por hora do dia, por turno
+SHIFT_HOURS = {
+    'morning': {8: 0.6, 9: 1.0, 10: 1.3, 11: 1.2, 12: 0.7, 13: 0.5},
+    'afternoon': {13: 0.6, 14: 1.1, 15: 1.3, 16: 1.2, 17: 0.9, 18: 0.6},
+    'night': {18: 0.7, 19: 1.0, 20: 0.9, 21: 0.6, 22: 0.3},
+}
+
+# Peso por dia da semana (segunda = 0); fim de semana com menos movimento
+WEEKDAY_WEIGHTS = (1.0, 1.05, 1.0, 0.95, 0.9, 0.35, 0.1)
+
+BATCH_SIZE = 100000
+
+# Vocabulário das transcrições e relatórios sintéticos (alimentam a busca textual)
+TOPICS = ('cancelamento', 'reembolso', 'segunda via do boleto', 'portabilidade',
+          'troca de plano', 'cobrança indevida', 'entrega atrasada', 'suporte técnico')
+OPENINGS = ('Bom dia, obrigado por ligar.', 'Boa tarde, em que posso ajudar?',
+            'Boa noite, com quem eu falo?')
+REQUESTS = ('O cliente pede {}.', 'O cliente reclama de {}.',
+            'O cliente liga pela segunda vez sobre {}.')
+AGENT_STEPS = ('Operador confirma os dados cadastrais.', 'Operador oferece desconto na próxima fatura.',
+               'Operador abre protocolo de atendimento.', 'Operador transfere para o setor responsável.',
+               'Operador explica o prazo de resolução.')
+CLOSINGS = ('Cliente agradece e encerra a ligação.', 'Cliente pede retorno em outro horário.',
+            'Ligação encerrada sem solução.')
+
+# Trigger da busca textual e índices de calls: recriados por init_database após a carga
+SUSPENDED_TRIGGERS = ('calls_fts_insert',)
+SUSPENDED_INDEXES = ('idx_calls_created_at', 'idx_calls_operator')
+
+
+def _timestamps(rng, count, hour_weights, day_weights, start):
+    """Gera created_at ('YYYY-MM-DD HH:MM:SS') seguindo os pesos de dia e hora"""
+    hours = np.array(list(hour_weights.keys()))
+    hour_p = np.array(list(hour_weights.values()), dtype=float)
+    day_p = np.asarray(day_weights, dtype=float)
+
+    days = rng.choice(len(day_p), size=count, p=day_p / day_p.sum())
+    hour = rng.choice(hours, size=count, p=hour_p / hour_p.sum())
+    seconds = rng.integers(0, 3600, size=count)
+
+    base = np.datetime64(start.strftime('%Y-%m-%dT00:00:00'), 's')
+    moments = base + (days * 86400 + hour * 3600 + seconds).astype('timedelta64[s]')
+    return np.char.replace(np.datetime_as_string(moments, unit='s'), 'T', ' ')
+
+
+def _texts(rng, count, conformity, alert, analysed, grade):
+    """Transcrição e relatório de cada chamada; relatório nulo se ainda sem análise"""
+    topic = rng.integers(0, len(TOPICS), size=count)
+    opening = rng.integers(0, len(OPENINGS), size=count)
+    request = rng.integers(0, len(REQUESTS), size=count)
+    steps = rng.integers(0, len(AGENT_STEPS), size=(count, 2))
+    closing = rng.integers(0, len(CLOSINGS), size=count)
+
+    transcripts = [
+        f'{OPENINGS[o]} {REQUESTS[r].format(TOPICS[t])} {AGENT_STEPS[s1]} {AGENT_STEPS[s2]} {CLOSINGS[c]}'
+        for t, o, r, (s1, s2), c in zip(topic.tolist(), opening.tolist(), request.tolist(),
+                                        steps.tolist(), closing.tolist())
+    ]
+    # "Nota final" no formato que operator_stats.extract_grade lê
+    reports = [
+        f"Assunto: {TOPICS[t]}. Procedimento {'seguido' if conf else 'não seguido'}."
+        f"{' Alerta: cliente insatisfeito.' if al else ''} Nota final: {g:.1f}" if ok else None
+        for t, conf, al, ok, g in zip(topic.tolist(), conformity.tolist(), alert.tolist(),
+                                      analysed.tolist(), grade.tolist())
+    ]
+    return transcripts, reports
+
+
+def seed_users(conn, rng, operators):
+    """Cria usuários e operadores; devolve ids, turnos e perfil de cada operador"""
+    password_hash = generate_password_hash(DEFAULT_PASSWORD)
+    first_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM users').fetchone()[0]
+    ids = np.arange(first_id, first_id + operators)
+
+    conn.executemany('''
+        INSERT INTO users (id, username, email, password_hash, role, active)
+        VALUES (?, ?, ?, ?, 'operator', ?)
+    ''', [
+        (int(user_id), f'operador_{user_id:06d}', f'operador_{user_id:06d}@monitor.ai', password_hash, 1)
+        for user_id in ids
+    ])
+
+    shifts = rng.choice(len(SHIFTS), size=operators, p=SHIFT_SHARE)
+    active = rng.random(operators) < 0.9
+    conn.executemany(
+        'INSERT INTO operators (user_id, shift, active) VALUES (?, ?, ?)',
+        [(int(user_id), SHIFTS[s], int(a)) for user_id, s, a in zip(ids, shifts, active)]
+    )
+
+    # Perfil: volume (cauda longa), qualidade e duração média por operador
+    profile = {
+        'ids': ids,
+        'shifts': shifts,
+        'volume': rng.pareto(2.0, size=operators) + 1.0,
+        'conformity': rng.beta(7, 3, size=operators),
+        'alert': rng.beta(1.5, 12, size=operators),
+        'duration': rng.lognormal(np.log(300), 0.25, size=operators),
+        'grade': np.clip(rng.normal(7.0, 1.2, size=operators), 2, 10),
+    }
+    return profile
+
+
+def seed_calls(conn, rng, profile, calls, days, end_date, batch_size=BATCH_SIZE):
+    """Insere as chamadas dos `days` dias até end_date em lotes; cada lote é uma transação"""
+    start = end_date - timedelta(days=days - 1)
+    # Pesos por dia do período, respeitando o dia da semana de cada data
+    day_weights = [WEEKDAY_WEIGHTS[(start + timedelta(days=d)).weekday()] for d in range(days)]
+    volume = profile['volume'] / profile['volume'].sum()
+
+    inserted = 0
+    while inserted < calls:
+        count = min(batch_size, calls - inserted)
+        operator = rng.choice(len(volume), size=count, p=volume)
+
+        created_at = np.empty(count, dtype=object)
+        for shift_index, shift in enumerate(SHIFTS):
+            mask = profile['shifts'][operator] == shift_index
+            if mask.any():
+                created_at[mask] = _timestamps(rng, int(mask.sum()), SHIFT_HOURS[shift], day_weights, start)
+
+        duration = np.maximum(
+            30, rng.lognormal(np.log(profile['duration'][operator]), 0.45)
+        ).astype(int)
+        conformity = rng.random(count) < profile['conformity'][operator]
+        alert = rng.random(count) < profile['alert'][operator]
+        # Parte das chamadas ainda sem análise da IA (score nulo)
+        analysed = rng.random(count) < 0.85
+        grade = np.round(np.clip(rng.normal(profile['grade'][operator], 1.0), 0, 10), 1)
+        transcripts, reports = _texts(rng, count, conformity, alert, analysed, grade)
+
+        rows = zip(
+            profile['ids'][operator].tolist(),
+            duration.tolist(),
+            conformity.astype(int).tolist(),
+            alert.astype(int).tolist(),
+            np.where(analysed, grade, np.nan).tolist(),
+            created_at.tolist(),
+            transcripts,
+            reports
+        )
+        with conn:
+            conn.executemany('''
+                INSERT INTO calls (operator_id, duration, conformity, alert_pending, score, created_at,
+                                   transcript, analysis_result)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', ((op, dur, conf, al, None if score != score else score, ts, text, report)
+                  for op, dur, conf, al, score, ts, text, report in rows))
+        inserted += count
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera dados sintéticos para o Monitor.AI')
+    # Nunca o banco de produção por padrão: a carga suspende o FTS e os índices
+    parser.add_argument('--db', default='carga.db', help='Arquivo SQLite de destino')
+    parser.add_argument('--operators', type=int, default=200)
+    parser.add_argument('--calls', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=90, help='Período coberto pelas chamadas')
+    parser.add_argument('--end-date', default=date.today().isoformat(),
+                        help='Último dia do período (AAAA-MM-DD); fixe para repetir a carga')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.operators < 1 or args.days < 1:
+        parser.error('--operators e --days devem ser positivos')
+    if args.calls < 0:
+        parser.error('--calls não pode ser negativo')
+    try:
+        end_date = datetime.strptime(args.end_date, '%Y-%m-%d')
+    except ValueError:
+        parser.error('--end-date deve estar no formato AAAA-MM-DD')
+
+    print(f"=== Gerando dados em {args.db} (seed {args.seed}) ===")
+    init_database(args.db)
+    rng = np.random.default_rng(args.seed)
+
+    conn = sqlite3.connect(args.db)
+    # Carga em massa: durabilidade não importa até o fim da geração
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('PRAGMA cache_size=-200000')
+
+    started = time.perf_counter()
+    with conn:
+        profile = seed_users(conn, rng, args.operators)
+    print(f"✓ {args.operators} usuários/operadores")
+
+    # Manter o índice FTS e os índices de calls linha a linha custa ~7x na carga
+    with conn:
+        for trigger in SUSPENDED_TRIGGERS:
+            conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        for index in SUSPENDED_INDEXES:
+            conn.execute(f'DROP INDEX IF EXISTS {index}')
+
+    try:
+        calls_started = time.perf_counter()
+        inserted = seed_calls(conn, rng, profile, args.calls, args.days, end_date, args.batch_size)
+        calls_elapsed = time.perf_counter() - calls_started
+        rate = inserted / calls_elapsed if calls_elapsed else 0
+        print(f"✓ {inserted} chamadas em {calls_elapsed:.1f}s ({rate:,.0f} linhas/s)")
+    finally:
+        # Mesmo se a carga falhar: com o esquema já na versão atual,
+        # init_database não recriaria o trigger e os índices depois
+        index_started = time.perf_counter()
+        init_database(args.db, force=True)
+        with conn:
+            # Lotes já gravados também precisam entrar no índice FTS
+            conn.execute("INSERT INTO calls_fts (calls_fts) VALUES ('rebuild')")
+            # Estatísticas e ranking coerentes com as chamadas geradas
+            operator_stats.rebuild(conn.cursor())
+        print(f"✓ Índices e estatísticas em {time.perf_counter() - index_started:.1f}s")
+    conn.execute('PRAGMA optimize')
+    conn.close()
+
+    size_mb = os.path.getsize(args.db) / 1024 / 1024
+    print(f"✓ Concluído em {time.perf_counter() - started:.1f}s ({size_mb:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Startup_bench.py - Mede o tempo de inicialização dos workers do Monitor.AI
+Sobe o gunicorn com gunicorn.conf.py em um banco temporário, dispara pedidos
+até todos os workers responderem e mostra, por worker, o tempo do fork até o
+app carregado e até o primeiro pedido atendido
+
+Uso:
+    python startup_bench.py --workers 4
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def read_log(path):
+    """Primeira entrada de cada worker no log de inicialização"""
+    entries = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                entry = json.loads(line)
+                entries.setdefault(entry['pid'], entry)
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def ping(url):
+    try:
+        # Conexão nova a cada pedido, para cair em qualquer worker
+        return requests.get(url, headers={'Connection': 'close'}, timeout=2).status_code == 200
+    except requests.RequestException:
+        return False
+
+
+def run(workers, app, timeout):
+    workdir = tempfile.mkdtemp(prefix='monitor_bench_')
+    log_path = os.path.join(workdir, 'startup.jsonl')
+    port = free_port()
+    url = f'http://127.0.0.1:{port}/'
+    env = dict(os.environ,
+               MONITOR_DATABASE=os.path.join(workdir, 'monitor_ai.db'),
+               SOCKETIO_QUEUE=os.path.join(workdir, 'socketio_queue.db'),
+               STARTUP_TIMING_LOG=log_path)
+
+    launched_at = time.time()
+    server = subprocess.Popen([
+        sys.executable, '-m', 'gunicorn',
+        '-c', os.path.join(BASE_DIR, 'gunicorn.conf.py'),
+        '--workers', str(workers),
+        '--bind', f'127.0.0.1:{port}',
+        app
+    ], cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    first_response = None
+    try:
+        with ThreadPoolExecutor(max_workers=workers * 2) as executor:
+            while time.time() - launched_at < timeout:
+                if server.poll() is not None:
+                    raise RuntimeError(f'gunicorn encerrou com código {server.returncode}')
+                ok = list(executor.map(ping, [url] * workers * 2))
+                if any(ok) and first_response is None:
+                    first_response = time.time()
+                if len(read_log(log_path)) >= workers:
+                    break
+                time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait()
+        entries = read_log(log_path)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return launched_at, first_response, entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tempo até o primeiro pedido por worker')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--app', default='main:create_app()', help='Alvo do gunicorn')
+    parser.add_argument('--timeout', type=float, default=60, help='Espera máxima (s)')
+    args = parser.parse_args()
+
+    launched_at, first_response, entries = run(args.workers, args.app, args.timeout)
+
+    print(f"=== {args.app} com {args.workers} workers ===")
+    if first_response is None:
+        print("Nenhum pedido atendido dentro do tempo limite")
+        return 1
+    print(f"Primeira resposta {first_response - launched_at:.3f}s após iniciar o gunicorn")
+    print(f"{'pid':>8} {'fork→app':>10} {'fork→1º pedido':>15} {'início→1º pedido':>17}")
+    for pid, entry in sorted(entries.items(), key=lambda item: item[1]['forked_at']):
+        print(f"{pid:>8} "
+              f"{entry['app_loaded_at'] - entry['forked_at']:>9.3f}s "
+              f"{entry['first_request_at'] - entry['forked_at']:>14.3f}s "
+              f"{entry['first_request_at'] - launched_at:>16.3f}s")
+    if len(entries) < args.workers:
+        print(f"Só {len(entries)} de {args.workers} workers atenderam dentro do tempo limite")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
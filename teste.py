@@ -1,125 +1,310 @@
 import requests
-from bs4 import BeautifulSoup
-import json
+from bs4 import BeautifulSoup, Tag
+import argparse
 import csv
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from urllib.parse import urldefrag, urljoin, urlparse
+
+from corpus import CorpusWriter
+
+# Headers para simular um navegador real
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+DEFAULT_URL = 'https://www.caedu.com.br/assistencia-pet'
+
+# Corpus único, só de acréscimo (com .gz no nome, grava comprimido)
+CORPUS_PATH = 'caedu_corpus.jsonl'
+
+# Seletores usados na extração (ajustar conforme a estrutura real do site)
+PRODUCT_CLASSES = {'product', 'card', 'item'}
+PRODUCT_NAME_TAGS, PRODUCT_NAME_CLASSES = {'h2', 'h3'}, {'name', 'title'}
+PRODUCT_PRICE_CLASSES = {'price', 'value', 'cost'}
+PROMO_CLASSES = {'promotion', 'banner', 'offer'}
+PROMO_TITLE_TAGS, PROMO_TITLE_CLASSES = {'h2', 'h3'}, {'title'}
+PROMO_DESCRIPTION_TAGS, PROMO_DESCRIPTION_CLASSES = {'p'}, {'description'}
+
+
+def _matches(element, tags, classes):
+    return element.name in tags or bool(classes.intersection(element.get('class') or ()))
 
-def scrape_caedu_multibonus():
-    # Configurar headers para simular um navegador real
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+def extract_page(html, url):
+    """
+    Extrai título, descrição, textos, links, imagens, produtos e promoções
+    percorrendo a árvore uma única vez (em vez de um find_all/select por item)
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+
+    data = {
+        'url': url,
+        'timestamp': datetime.now().isoformat(),
+        'title': '',
+        'meta_description': '',
+        'text_content': [],
+        'links': [],
+        'all_links': [],
+        'images': [],
+        'products': [],
+        'promotions': []
     }
-    
-    url = 'https://www.caedu.com.br/assistencia-pet'
-    
+
+    # Conteúdo do primeiro <main>; sem <main>, vale o <body> inteiro
+    buckets = {'main': {'text_content': [], 'links': [], 'images': []},
+               'body': {'text_content': [], 'links': [], 'images': []}}
+    seen_main = False
+    found_title = found_meta = False
+
+    # Pilha de (elemento, produtos abertos, promoções abertas, dentro do main)
+    stack = [(child, (), (), False) for child in reversed(soup.contents)]
+    while stack:
+        element, products, promos, in_main = stack.pop()
+        if not isinstance(element, Tag):
+            continue
+        name = element.name
+
+        if name == 'title' and not found_title:
+            found_title = True
+            data['title'] = element.string
+        elif name == 'meta' and not found_meta and element.get('name') == 'description':
+            found_meta = True
+            data['meta_description'] = element.get('content') or ''
+        elif name == 'main' and not seen_main:
+            seen_main = in_main = True
+
+        # Primeiro nome/preço/título/descrição dentro de cada bloco aberto
+        for product in products:
+            if product['name'] is None and _matches(element, PRODUCT_NAME_TAGS, PRODUCT_NAME_CLASSES):
+                product['name'] = element
+            if product['price'] is None and _matches(element, (), PRODUCT_PRICE_CLASSES):
+                product['price'] = element
+        for promo in promos:
+            if promo['title'] is None and _matches(element, PROMO_TITLE_TAGS, PROMO_TITLE_CLASSES):
+                promo['title'] = element
+            if promo['description'] is None and _matches(element, PROMO_DESCRIPTION_TAGS, PROMO_DESCRIPTION_CLASSES):
+                promo['description'] = element
+
+        targets = [buckets['body']] + ([buckets['main']] if in_main else [])
+        if name == 'p':
+            text = element.get_text().strip()
+            if text and len(text) > 10:  # Filtrar textos muito curtos
+                for bucket in targets:
+                    bucket['text_content'].append(text)
+        elif name == 'a' and element.get('href'):
+            href = element['href']
+            if not href.startswith('javascript:'):
+                link = {'text': element.get_text().strip(), 'url': urljoin(url, href)}
+                for bucket in targets:
+                    bucket['links'].append(link)
+        elif name == 'img' and element.get('src'):
+            image = {'alt': element.get('alt', ''), 'src': urljoin(url, element['src'])}
+            for bucket in targets:
+                bucket['images'].append(image)
+
+        classes = set(element.get('class') or ())
+        if classes & PRODUCT_CLASSES:
+            product = {'name': None, 'price': None}
+            data['products'].append(product)
+            products = products + (product,)
+        if classes & PROMO_CLASSES:
+            promo = {'title': None, 'description': None}
+            data['promotions'].append(promo)
+            promos = promos + (promo,)
+
+        for child in reversed(element.contents):
+            if isinstance(child, Tag):
+                stack.append((child, products, promos, in_main))
+
+    bucket = buckets['main'] if seen_main else buckets['body']
+    data.update(bucket)
+    # Links do documento inteiro (menu, cabeçalho, rodapé): é o que o crawl segue
+    data['all_links'] = buckets['body']['links']
+
+    data['products'] = [{
+        'name': product['name'].get_text().strip(),
+        'price': product['price'].get_text().strip() if product['price'] else 'Não informado'
+    } for product in data['products'] if product['name'] is not None]
+    data['promotions'] = [{
+        'title': promo['title'].get_text().strip(),
+        'description': promo['description'].get_text().strip() if promo['description'] else ''
+    } for promo in data['promotions'] if promo['title'] is not None]
+
+    return data
+
+
+def scrape_caedu_multibonus(url=DEFAULT_URL):
     try:
         # Fazer a requisição para o site
-        response = requests.get(url, headers=headers, timeout=10)
+        response = requests.get(url, headers=HEADERS, timeout=10)
         response.raise_for_status()  # Verifica se a requisição foi bem-sucedida
-        
-        # Parse do conteúdo HTML
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Dicionário para armazenar os dados coletados
-        data = {
-            'url': url,
-            'timestamp': datetime.now().isoformat(),
-            'title': '',
-            'meta_description': '',
-            'text_content': [],
-            'links': [],
-            'images': [],
-            'products': [],
-            'promotions': []
-        }
-        
-        # Extrair título da página
-        if soup.title:
-            data['title'] = soup.title.string
-        
-        # Extrair meta descrição
-        meta_desc = soup.find('meta', attrs={'name': 'description'})
-        if meta_desc and meta_desc.get('content'):
-            data['meta_description'] = meta_desc['content']
-        
-        # Extrair texto do conteúdo principal (ajustar seletores conforme necessário)
-        main_content = soup.find('main') or soup.body
-        if main_content:
-            # Extrair parágrafos de texto
-            paragraphs = main_content.find_all('p')
-            for p in paragraphs:
-                text = p.get_text().strip()
-                if text and len(text) > 10:  # Filtrar textos muito curtos
-                    data['text_content'].append(text)
-            
-            # Extrair links
-            links = main_content.find_all('a', href=True)
-            for link in links:
-                href = link['href']
-                text = link.get_text().strip()
-                if href and not href.startswith('javascript:'):
-                    data['links'].append({
-                        'text': text,
-                        'url': href if href.startswith('http') else url + href.lstrip('/')
-                    })
-            
-            # Extrair imagens
-            images = main_content.find_all('img', src=True)
-            for img in images:
-                src = img['src']
-                alt = img.get('alt', '')
-                data['images'].append({
-                    'alt': alt,
-                    'src': src if src.startswith('http') else url + src.lstrip('/')
-                })
-        
-        # Tentar identificar produtos (ajustar seletores conforme a estrutura real do site)
-        product_elements = soup.select('.product, .card, .item')  # Seletores comuns para produtos
-        for product in product_elements:
-            try:
-                name = product.select_one('h2, h3, .name, .title')
-                price = product.select_one('.price, .value, .cost')
-                
-                if name:
-                    product_data = {
-                        'name': name.get_text().strip(),
-                        'price': price.get_text().strip() if price else 'Não informado'
-                    }
-                    data['products'].append(product_data)
-            except:
-                continue
-        
-        # Tentar identificar promoções (ajustar seletores conforme necessário)
-        promo_elements = soup.select('.promotion, .banner, .offer')
-        for promo in promo_elements:
-            try:
-                title = promo.select_one('h2, h3, .title')
-                description = promo.select_one('p, .description')
-                
-                if title:
-                    promo_data = {
-                        'title': title.get_text().strip(),
-                        'description': description.get_text().strip() if description else ''
-                    }
-                    data['promotions'].append(promo_data)
-            except:
-                continue
-        
-        return data
+        return extract_page(response.content, url)
         
     except requests.RequestException as e:
         print(f"Erro ao acessar o site: {e}")
         return None
 
-def save_data(data, format='json'):
+
+# ==================== CRAWLER ====================
+
+class HostRateLimiter:
+    """Intervalo mínimo entre requisições ao mesmo host, compartilhado entre threads"""
+
+    def __init__(self, requests_per_second=1.0):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, host):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class PageCache:
+    """Cache em disco com corpo e validadores (ETag/Last-Modified) por URL"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, key)
+        return base + '.json', base + '.html'
+
+    def get(self, url):
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def put(self, url, headers, body):
+        meta_path, body_path = self._paths(url)
+        meta = {
+            'url': url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'fetched_at': datetime.now().isoformat()
+        }
+        # Corpo antes dos metadados: meta sem corpo nunca fica no disco
+        with open(body_path + '.tmp', 'wb') as f:
+            f.write(body)
+        os.replace(body_path + '.tmp', body_path)
+        with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+
+
+class CachedFetcher:
+    """GET condicional contra o cache, com limite por host e sessão por thread"""
+
+    def __init__(self, cache, limiter, timeout=10):
+        self.cache = cache
+        self.limiter = limiter
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(HEADERS)
+            self._local.session = session
+        return session
+
+    def fetch(self, url):
+        """Retorna (conteúdo, veio_do_cache); 304 reaproveita o corpo salvo"""
+        meta, cached_body = self.cache.get(url)
+        headers = {}
+        if meta:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        self.limiter.wait(urlparse(url).netloc)
+        response = self._session().get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and cached_body is not None:
+            return cached_body, True
+        response.raise_for_status()
+        self.cache.put(url, response.headers, response.content)
+        return response.content, False
+
+
+def _normalize_url(url):
+    """Remove fragmento (#...) para não visitar a mesma página duas vezes"""
+    return urldefrag(url)[0]
+
+
+def crawl(start_url=DEFAULT_URL, max_depth=1, max_workers=4, cache_dir='.crawler_cache',
+          requests_per_second=1.0, max_pages=200):
+    """
+    Percorre o site a partir de start_url seguindo links do mesmo host até max_depth
+    Cada nível é buscado em paralelo (max_workers); gera os dados de cada página
+    assim que ela é extraída, com as chaves extras 'depth' e 'from_cache'
+    """
+    fetcher = CachedFetcher(PageCache(cache_dir), HostRateLimiter(requests_per_second))
+    host = urlparse(start_url).netloc
+    start_url = _normalize_url(start_url)
+    visited = {start_url}
+    level = [start_url]
+
+    def process(url):
+        content, from_cache = fetcher.fetch(url)
+        return extract_page(content, url), from_cache
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for depth in range(max_depth + 1):
+            if not level:
+                break
+            next_level = []
+            futures = {executor.submit(process, url): url for url in level}
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    page, from_cache = future.result()
+                except (requests.RequestException, OSError) as e:
+                    print(f"Erro ao acessar {url}: {e}")
+                    continue
+
+                page['depth'] = depth
+                page['from_cache'] = from_cache
+                if depth < max_depth:
+                    for link in page['all_links']:
+                        target = _normalize_url(link['url'])
+                        if (urlparse(target).netloc == host and target.startswith(('http://', 'https://'))
+                                and target not in visited and len(visited) < max_pages):
+                            visited.add(target)
+                            next_level.append(target)
+                yield page
+            level = next_level
+
+def save_data(data, format='json', corpus_path=CORPUS_PATH):
     """Salva os dados coletados em diferentes formatos"""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
     if format == 'json':
-        filename = f"caedu_multibonus_{timestamp}.json"
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        print(f"Dados salvos em {filename}")
+        # Acrescenta ao corpus em vez de criar um arquivo novo a cada execução
+        with CorpusWriter(corpus_path) as writer:
+            record = writer.write_page(data)
+        if record is None:
+            print(f"Nada novo para {corpus_path}")
+        else:
+            print(f"Dados salvos em {corpus_path} (registro {record})")
     
     elif format == 'csv':
         # Salvar produtos em CSV
@@ -143,22 +328,49 @@ def save_data(data, format='json'):
             print(f"Promoções salvas em {filename}")
 
 if __name__ == "__main__":
-    print("Coletando dados do site Caedu Multibônus...")
-    website_data = scrape_caedu_multibonus()
-    
-    if website_data:
-        print("Dados coletados com sucesso!")
-        print(f"Título: {website_data['title']}")
-        print(f"Descrição: {website_data['meta_description']}")
-        print(f"Encontrados {len(website_data['products'])} produtos")
-        print(f"Encontradas {len(website_data['promotions'])} promoções")
-        
-        # Salvar dados em JSON
-        save_data(website_data, 'json')
-        
-        # Salvar dados estruturados em CSV também
-        save_data(website_data, 'csv')
-        
-        print("\nAgora você pode usar esses dados para criar material de treinamento com IA!")
+    parser = argparse.ArgumentParser(description='Coleta de dados do site Caedu')
+    parser.add_argument('--url', default=DEFAULT_URL)
+    parser.add_argument('--crawl', action='store_true', help='Segue links do mesmo site')
+    parser.add_argument('--depth', type=int, default=1, help='Profundidade máxima do crawler')
+    parser.add_argument('--workers', type=int, default=4, help='Downloads simultâneos')
+    parser.add_argument('--rate', type=float, default=1.0, help='Requisições por segundo por host')
+    parser.add_argument('--max-pages', type=int, default=200)
+    parser.add_argument('--cache-dir', default='.crawler_cache')
+    parser.add_argument('--corpus', default=CORPUS_PATH, help='Arquivo JSONL do corpus (.gz comprime)')
+    args = parser.parse_args()
+
+    if args.crawl:
+        print(f"Rastreando {args.url} (profundidade {args.depth})...")
+        total = cached = 0
+        # Cada página vai para o corpus assim que é extraída
+        with CorpusWriter(args.corpus) as writer:
+            for page in crawl(args.url, max_depth=args.depth, max_workers=args.workers,
+                              cache_dir=args.cache_dir, requests_per_second=args.rate,
+                              max_pages=args.max_pages):
+                total += 1
+                cached += page['from_cache']
+                writer.write_page(page)
+                print(f"[{page['depth']}] {page['url']} - {len(page['products'])} produtos, "
+                      f"{len(page['promotions'])} promoções{' (cache)' if page['from_cache'] else ''}")
+        print(f"{total} páginas coletadas ({cached} sem alteração desde o cache)")
+        print(f"Corpus {args.corpus}: {writer.records} registros ({writer.skipped} páginas sem conteúdo novo)")
     else:
-        print("Falha ao coletar dados do site.")
\ No newline at end of file
+        print("Coletando dados do site Caedu Multibônus...")
+        website_data = scrape_caedu_multibonus(args.url)
+        
+        if website_data:
+            print("Dados coletados com sucesso!")
+            print(f"Título: {website_data['title']}")
+            print(f"Descrição: {website_data['meta_description']}")
+            print(f"Encontrados {len(website_data['products'])} produtos")
+            print(f"Encontradas {len(website_data['promotions'])} promoções")
+            
+            # Acrescentar ao corpus em JSONL
+            save_data(website_data, 'json', args.corpus)
+            
+            # Salvar dados estruturados em CSV também
+            save_data(website_data, 'csv')
+            
+            print("\nAgora você pode usar esses dados para criar material de treinamento com IA!")
+        else:
+            print("Falha ao coletar dados do site.")
\ No newline at end of file
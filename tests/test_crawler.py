@@ -0,0 +1,104 @@
+"""
+Test_crawler.py - Crawler do teste.py contra um servidor HTTP estático local
+Confere a profundidade, o descarte de hosts externos, o GET condicional (304
+na segunda passada) e a gravação sem duplicados no corpus
+"""
+
+import functools
+import os
+import sys
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('requests')
+pytest.importorskip('bs4')
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from corpus import CorpusWriter, read_record  # noqa: E402
+from teste import crawl  # noqa: E402
+
+SHARED = '<p>Texto repetido em todas as páginas do site de teste.</p>'
+
+PAGES = {
+    # Links no menu e no rodapé (fora do <main>) também são seguidos
+    'index.html': f'''<html><head><title>Início</title></head><body>
+        <nav><a href="a.html">A</a></nav>
+        <main>{SHARED}<p>Conteúdo exclusivo da página inicial.</p><a href="b.html#topo">B</a></main>
+        <footer><a href="http://externo.invalid/pagina.html">Externo</a></footer>
+    </body></html>''',
+    'a.html': f'''<html><body><main>{SHARED}<p>Conteúdo exclusivo da página A.</p>
+        <a href="c.html">C</a><a href="index.html">Início</a></main></body></html>''',
+    'b.html': f'''<html><body><main>{SHARED}<p>Conteúdo exclusivo da página B.</p></main></body></html>''',
+    # Só é alcançada com profundidade 2
+    'c.html': f'''<html><body><main>{SHARED}<p>Conteúdo exclusivo da página C.</p></main></body></html>''',
+}
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    requested = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        QuietHandler.requested.append(self.path)
+        super().do_GET()
+
+
+@pytest.fixture
+def site(tmp_path):
+    root = tmp_path / 'site'
+    root.mkdir()
+    for name, html in PAGES.items():
+        (root / name).write_text(html, encoding='utf-8')
+
+    QuietHandler.requested = []
+    handler = functools.partial(QuietHandler, directory=str(root))
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}/'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _crawl(url, tmp_path):
+    return list(crawl(url + 'index.html', max_depth=1, max_workers=2,
+                      cache_dir=str(tmp_path / 'cache'), requests_per_second=0))
+
+
+def test_crawl_follows_links_up_to_max_depth(site, tmp_path):
+    pages = _crawl(site, tmp_path)
+
+    depths = {page['url'][len(site):]: page['depth'] for page in pages}
+    assert depths == {'index.html': 0, 'a.html': 1, 'b.html': 1}
+    assert '/c.html' not in QuietHandler.requested
+    assert not any(page['from_cache'] for page in pages)
+
+
+def test_second_crawl_uses_cache_and_corpus_skips_duplicates(site, tmp_path):
+    corpus_path = str(tmp_path / 'corpus.jsonl')
+
+    with CorpusWriter(corpus_path) as writer:
+        for page in _crawl(site, tmp_path):
+            writer.write_page(page)
+        assert writer.records == 3
+
+    with CorpusWriter(corpus_path) as writer:
+        pages = _crawl(site, tmp_path)
+        for page in pages:
+            assert writer.write_page(page) is None
+        assert writer.records == 3
+        assert writer.skipped == 3
+
+    assert len(pages) == 3
+    assert all(page['from_cache'] for page in pages)
+
+    texts = [text for number in range(3) for text in read_record(corpus_path, number)['text_content']]
+    assert len(texts) == len(set(texts)) == 4
@@ -0,0 +1,103 @@
+"""
+Test_fanout.py - Eventos Socket.IO entre vários workers do gunicorn
+Sobe o modo produção (gunicorn.conf.py) com 3 workers em um banco e uma fila
+temporários, conecta vários clientes e confere que todos recebem cada evento
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+requests = pytest.importorskip('requests')
+socketio = pytest.importorskip('socketio')
+pytest.importorskip('gunicorn')
+pytest.importorskip('websocket')
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKERS = 3
+CLIENTS = 8
+EVENTS = 10
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def server(tmp_path):
+    port = _free_port()
+    url = f'http://127.0.0.1:{port}'
+    env = dict(os.environ,
+               MONITOR_DATABASE=str(tmp_path / 'monitor_ai.db'),
+               SOCKETIO_QUEUE=str(tmp_path / 'socketio_queue.db'),
+               GUNICORN_THREADS='20')
+    process = subprocess.Popen([
+        sys.executable, '-m', 'gunicorn',
+        '-c', os.path.join(BASE_DIR, 'gunicorn.conf.py'),
+        '--workers', str(WORKERS),
+        '--bind', f'127.0.0.1:{port}',
+        'main:create_app()'
+    ], cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    try:
+        deadline = time.time() + 30
+        while True:
+            assert process.poll() is None, 'gunicorn encerrou antes de responder'
+            try:
+                if requests.get(url, timeout=1).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            assert time.time() < deadline, 'gunicorn não respondeu a tempo'
+            time.sleep(0.1)
+        yield url
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def test_every_client_receives_every_event(server):
+    received = {i: [] for i in range(CLIENTS)}
+    lock = threading.Lock()
+    clients = []
+
+    try:
+        for i in range(CLIENTS):
+            client = socketio.Client()
+
+            def on_call_created(data, i=i):
+                with lock:
+                    received[i].append(data['call_id'])
+
+            client.on('call_created', on_call_created)
+            client.connect(server, transports=['websocket'])
+            clients.append(client)
+
+        call_ids = []
+        for _ in range(EVENTS):
+            # Conexão nova a cada POST, para os eventos saírem de workers diferentes
+            response = requests.post(f'{server}/api/calls', json={'operator_id': 1, 'score': 8},
+                                     headers={'Connection': 'close'}, timeout=10)
+            assert response.status_code == 201
+            call_ids.append(response.json()['call_id'])
+
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            with lock:
+                if all(len(ids) >= EVENTS for ids in received.values()):
+                    break
+            time.sleep(0.05)
+    finally:
+        for client in clients:
+            client.disconnect()
+
+    for i, ids in received.items():
+        assert sorted(ids) == sorted(call_ids), f'cliente {i} recebeu {len(ids)} de {EVENTS} eventos'